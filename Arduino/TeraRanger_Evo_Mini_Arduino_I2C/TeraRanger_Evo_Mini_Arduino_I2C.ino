@@ -57,6 +57,38 @@ uint8_t crc8(uint8_t *p, uint8_t len) {
   return crc & 0xFF;
 }
 
+// Output format on the USB serial port (Serial)
+// BINARY_OUTPUT 0 : human readable lines, e.g. "Distance in mm : 1234"
+// BINARY_OUTPUT 1 : 5-byte frames 'B', sensor id, distance MSB, distance LSB, crc8 (same CRC-8 as the Evo frames)
+//                   decoded on the host by Python/Arduino_bridge_reader_py3.py
+#define BINARY_OUTPUT 0
+#define SENSOR_ID 0               // Sensor id sent in binary frames, give each bridged sensor its own
+#if BINARY_OUTPUT
+#define HOST_BAUDRATE 1000000     // Binary frames are meant to be read by a program, use a fast link
+#else
+#define HOST_BAUDRATE 115200      // Serial monitor friendly
+#endif
+
+/*
+ * Brief : Send one distance to the host, as a binary frame or as a text line
+ * Param1 : (sensor_id) id of the sensor (or pixel) the distance comes from
+ * Param2 : (distance) distance in millimeter
+ */
+void sendDistance(uint8_t sensor_id, uint16_t distance) {
+#if BINARY_OUTPUT
+  uint8_t frame[5];
+  frame[0] = 'B';
+  frame[1] = sensor_id;
+  frame[2] = distance >> 8;
+  frame[3] = distance & 0xFF;
+  frame[4] = crc8(frame, 4);
+  Serial.write(frame, 5);
+#else
+  Serial.print("Distance in mm : ");
+  Serial.println(distance);
+#endif
+}
+
 uint8_t buf[3];           // The variable "buf[3]" will contain the frame sent by the TeraRanger
 uint16_t distance = 0;    // The variable "distance" will contain the distance value in millimeter
 uint8_t CRC = 0;          // The variable "CRC" will contain the checksum to compare at TeraRanger's one
@@ -68,7 +100,7 @@ int inter = 25; // Inter reading delay, replace by 50 if using long mode
 
 void setup() {
   pinMode(13, OUTPUT);    // Initialize digital pin 13 as an output (ERASABLE if the communication works)
-  Serial.begin(115200);   // Open serial port 0 (which corresponds to USB port), set data rate to 115200 bps
+  Serial.begin(HOST_BAUDRATE);   // Open serial port 0 (which corresponds to USB port), set data rate to HOST_BAUDRATE
   Wire.begin();           // Join I2C bus as master
 
   // Set your sensor mode
@@ -95,11 +127,12 @@ void loop() {
   
   if (CRC == buf[2]) {                  // If the function crc8 return the same checksum than the TeraRanger, then:
     distance = (buf[0]<<8) + buf[1];    // Calculate distance in mm
-    Serial.print("Distance in mm : ");
-    Serial.println(distance);
+    sendDistance(SENSOR_ID, distance);
   }
   else {
+#if !BINARY_OUTPUT
     Serial.println("CRC error!");
+#endif
   }
 
   delay(inter);                         // This delay is necessary to prevent reading too many times the same measurement (To be adapted depending on the sensor mode)
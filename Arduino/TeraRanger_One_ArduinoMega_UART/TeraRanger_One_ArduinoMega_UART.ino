@@ -51,6 +51,38 @@ uint8_t crc8(uint8_t *p, uint8_t len) {
   return crc & 0xFF;
 }
 
+// Output format on the USB serial port (Serial)
+// BINARY_OUTPUT 0 : human readable lines, e.g. "Distance in mm : 1234"
+// BINARY_OUTPUT 1 : 5-byte frames 'B', sensor id, distance MSB, distance LSB, crc8 (same CRC-8 as the Evo frames)
+//                   decoded on the host by Python/Arduino_bridge_reader_py3.py
+#define BINARY_OUTPUT 0
+#define SENSOR_ID 0               // Sensor id sent in binary frames, give each bridged sensor its own
+#if BINARY_OUTPUT
+#define HOST_BAUDRATE 1000000     // Binary frames are meant to be read by a program, use a fast link
+#else
+#define HOST_BAUDRATE 115200      // Serial monitor friendly
+#endif
+
+/*
+ * Brief : Send one distance to the host, as a binary frame or as a text line
+ * Param1 : (sensor_id) id of the sensor (or pixel) the distance comes from
+ * Param2 : (distance) distance in millimeter
+ */
+void sendDistance(uint8_t sensor_id, uint16_t distance) {
+#if BINARY_OUTPUT
+  uint8_t frame[5];
+  frame[0] = 'B';
+  frame[1] = sensor_id;
+  frame[2] = distance >> 8;
+  frame[3] = distance & 0xFF;
+  frame[4] = crc8(frame, 4);
+  Serial.write(frame, 5);
+#else
+  Serial.print("Distance in mm : ");
+  Serial.println(distance);
+#endif
+}
+
 
 // This enumeration allows to set the TeraRanger in Binary runmode
 typedef enum printOutModes {
@@ -72,7 +104,7 @@ uint16_t distance;                  // The variable "distance" will contain the
 
 void setup() {
   pinMode(13, OUTPUT);              // Initialize digital pin 13 as an output (ERASABLE if the communication works)
-  Serial.begin(115200);             // Open serial port 0 (which corresponds to USB port and pins TX0 and RX0), set data rate to 115200 bps
+  Serial.begin(HOST_BAUDRATE);             // Open serial port 0 (which corresponds to USB port and pins TX0 and RX0), set data rate to HOST_BAUDRATE
   Serial1.begin(115200);            // Open serial port 1 (which corresponds to pins TX1 and RX1), set data rate to 115200 bps
   Serial1.write(RUNMODE_PRECISE);   // Set the TeraRanger in Precise runmode
   Serial1.write(PRINTOUT_BINARY);   // Set the TeraRanger in Binary runmode
@@ -98,8 +130,7 @@ void loop() {
           Framereceived[index1] = inChar;                       // The array "Framereceived[index1]" receive the value of "inChar" for index1 = 3 (which will be the byte of checksum)
           if (crc8(Framereceived, 3) == Framereceived[3]) {     // If the function crc8 return the same checksum than the TeraRanger, then:
             distance = (Framereceived[1]<<8) + Framereceived[2];  // Calculate distance in mm
-            Serial.print("Distance in mm : ");                      // Start of the ERASABLE part
-            Serial.println(distance);                               //
+            sendDistance(SENSOR_ID, distance);                      // Start of the ERASABLE part
             if ((distance >= 200) && (distance < 400)) {            //
               analogWrite(13, 0);                                   //
             }                                                       //
@@ -48,6 +48,38 @@ uint8_t crc8(uint8_t *p, uint8_t len) {
   return crc & 0xFF;
 }
 
+// Output format on the USB serial port (Serial)
+// BINARY_OUTPUT 0 : human readable lines, e.g. "Distance in mm : 1234"
+// BINARY_OUTPUT 1 : 5-byte frames 'B', sensor id, distance MSB, distance LSB, crc8 (same CRC-8 as the Evo frames)
+//                   decoded on the host by Python/Arduino_bridge_reader_py3.py
+#define BINARY_OUTPUT 0
+#define SENSOR_ID 0               // Sensor id sent in binary frames, give each bridged sensor its own
+#if BINARY_OUTPUT
+#define HOST_BAUDRATE 1000000     // Binary frames are meant to be read by a program, use a fast link
+#else
+#define HOST_BAUDRATE 115200      // Serial monitor friendly
+#endif
+
+/*
+ * Brief : Send one distance to the host, as a binary frame or as a text line
+ * Param1 : (sensor_id) id of the sensor (or pixel) the distance comes from
+ * Param2 : (distance) distance in millimeter
+ */
+void sendDistance(uint8_t sensor_id, uint16_t distance) {
+#if BINARY_OUTPUT
+  uint8_t frame[5];
+  frame[0] = 'B';
+  frame[1] = sensor_id;
+  frame[2] = distance >> 8;
+  frame[3] = distance & 0xFF;
+  frame[4] = crc8(frame, 4);
+  Serial.write(frame, 5);
+#else
+  Serial.print("Distance in mm : ");
+  Serial.println(distance);
+#endif
+}
+
 // List of commands
 const byte PRINTOUT_BINARY[4]             = {0x00,0x11,0x02,0x4C};
 const byte PRINTOUT_TEXT[4]               = {0x00,0x11,0x01,0x45};
@@ -68,7 +100,7 @@ uint16_t distance3;
 
 void setup() {
   pinMode(13, OUTPUT);// Initialize digital pin 13 as an output (ERASABLE if the communication works)
-  Serial.begin(115200);// Open serial port 0 (which corresponds to USB port and pins TX0 and RX0), set data rate to 115200 bps
+  Serial.begin(HOST_BAUDRATE);// Open serial port 0 (which corresponds to USB port and pins TX0 and RX0), set data rate to HOST_BAUDRATE
   Serial1.begin(115200);// Open serial port 1 (which corresponds to pins TX1 and RX1), set data rate to 115200 bps
 
   Serial1.write(RUNMODE_SINGLE_PIXEL, 4); // Set the TeraRanger in single-pixel mode
@@ -106,8 +138,7 @@ void loop() {
       if (crc8(Framereceived, 3) == Framereceived[3]) {
         //Convert bytes to distance
         distance = (Framereceived[1]<<8) + Framereceived[2];
-        Serial.print("Distance in mm : ");
-        Serial.println(distance);
+        sendDistance(SENSOR_ID, distance);
 
         index = 0;
         Framereceived[0] = 0;
@@ -120,10 +151,16 @@ void loop() {
         distance  = (Framereceived[1]<<8) + Framereceived[2];
         distance1 = (Framereceived[3]<<8) + Framereceived[4];
 
+#if BINARY_OUTPUT
+        // One frame per pixel, the pixel index is added to the sensor id
+        sendDistance(SENSOR_ID, distance);
+        sendDistance(SENSOR_ID + 1, distance1);
+#else
         Serial.print("Distances in mm : ");
         Serial.print(distance);
         Serial.print(" | ");
         Serial.println(distance1);
+#endif
 
         index = 0;
         Framereceived[0] = 0;
@@ -138,6 +175,12 @@ void loop() {
         distance2 = (Framereceived[5]<<8) + Framereceived[6];
         distance3 = (Framereceived[7]<<8) + Framereceived[8];
 
+#if BINARY_OUTPUT
+        sendDistance(SENSOR_ID, distance);
+        sendDistance(SENSOR_ID + 1, distance1);
+        sendDistance(SENSOR_ID + 2, distance2);
+        sendDistance(SENSOR_ID + 3, distance3);
+#else
         Serial.print("Distances in mm : ");
         Serial.print(distance);
         Serial.print(" | ");
@@ -146,6 +189,7 @@ void loop() {
         Serial.print(distance2);
         Serial.print(" | ");
         Serial.println(distance3);
+#endif
 
         index = 0;
         Framereceived[0] = 0;
@@ -154,7 +198,9 @@ void loop() {
       {
         index = 0;
         Framereceived[0] = 0;
+#if !BINARY_OUTPUT
         Serial.println("CRC checks failed. Couldn't find valid frame in buffer length");
+#endif
       }
     }
   }
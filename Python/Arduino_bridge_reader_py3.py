@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Host reader for the Arduino bridge sketches (../Arduino).
+
+Decodes both output formats of the sketches in bulk:
+    - binary frames (BINARY_OUTPUT 1): 'B', sensor id, distance MSB,
+      distance LSB, crc8 (same CRC-8 as the Evo frames)
+    - legacy text lines (BINARY_OUTPUT 0): "Distance in mm : 1234" and
+      "Distances in mm : 1 | 2 | 3 | 4" (one sensor id per pixel)
+
+Every reading is stamped with the host monotonic time at which its first byte
+arrived, the read time minus the wire time of the bytes received from the
+start of its frame or line on, as for the Evo drivers (see Evo_transport_py3).
+
+Usage:
+    python3 Arduino_bridge_reader_py3.py <port> [binary|text] [baudrate]
+"""
+import sys
+import time
+import numpy as np
+import serial
+import threading
+from Evo_transport_py3 import arrival_time
+from Evo_frames_py3 import crc8_table, scan_frames, check_ranges
+
+BINARY = "binary"
+TEXT = "text"
+
+
+class ArduinoBridgeReader(object):
+    FRAME_HEADER = b"B"
+    FRAME_LENGTH = 5
+
+    def __init__(self, portname, mode=BINARY, baudrate=None):
+        if baudrate is None:
+            baudrate = 1000000 if mode == BINARY else 115200  # HOST_BAUDRATE of the sketches
+        self.mode = mode
+        self.baudrate = baudrate
+        self.port = serial.Serial(portname, baudrate=baudrate, timeout=0.05)
+        self.port.isOpen()
+        self.serial_lock = threading.Lock()
+        self.crc_table = crc8_table()
+        self.buffer = b""
+
+    def read(self):
+        '''
+        Reads everything waiting on the port and returns the decoded readings
+        as (timestamps, sensor_ids, ranges) arrays, ranges in meters
+        '''
+        with self.serial_lock:
+            data = self.port.read(max(1, self.port.in_waiting))
+            read_time = time.monotonic()
+        self.buffer += data
+        if self.mode == BINARY:
+            starts, ids, raw, consumed = self.decode_binary(self.buffer)
+        else:
+            starts, ids, raw, consumed = self.decode_text(self.buffer)
+
+        timestamps = arrival_time(read_time, len(self.buffer) - starts, self.baudrate)
+        self.buffer = self.buffer[consumed:]
+        return timestamps, ids, check_ranges(raw)
+
+    def decode_binary(self, data):
+        length = ArduinoBridgeReader.FRAME_LENGTH
+        starts, frames, consumed = scan_frames(data, ArduinoBridgeReader.FRAME_HEADER, length, self.crc_table)
+        raw = (frames[:, 2].astype(np.uint16) << 8) | frames[:, 3]
+        return starts, frames[:, 1].copy(), raw, consumed
+
+    def decode_text(self, data):
+        end = data.rfind(b"\n")
+        if end == -1:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint16), 0
+        lines = data[:end + 1].split(b"\n")[:-1]
+
+        ### Keep the value part of distance lines, "|" separates the pixels of Evo Mini ###
+        ### Lines with a non-digit field (noise on the link) are dropped, never partly parsed ###
+        values = []
+        starts = []
+        counts = []
+        malformed = 0
+        start = 0
+        for line in lines:
+            if line.startswith(b"Distance"):
+                value = line.partition(b":")[2].replace(b"|", b" ")
+                fields = value.split()
+                if fields and all(field.isdigit() for field in fields):
+                    values.append(value)
+                    starts.append(start)
+                    counts.append(len(fields))
+                else:
+                    malformed += 1
+            start += len(line) + 1
+        if malformed:
+            print("Discarding {} malformed lines".format(malformed))
+        if not values:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.uint16), end + 1
+        counts = np.array(counts)
+        raw = np.fromstring(b" ".join(values), dtype=np.int64, sep=" ")
+        ids = np.arange(raw.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(starts, counts), ids.astype(np.uint8), raw, end + 1
+
+    def stop(self):
+        self.port.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('\n[ERROR] Correct usage $ python3 Arduino_bridge_reader_py3.py port [binary|text] [baudrate]')
+        sys.exit(1)
+
+    mode = sys.argv[2] if len(sys.argv) > 2 else BINARY
+    baudrate = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    bridge = ArduinoBridgeReader(sys.argv[1], mode, baudrate)
+    try:
+        while True:
+            timestamps, ids, ranges = bridge.read()
+            for t, sensor_id, rng in zip(timestamps, ids, ranges):
+                print("{:.4f} sensor {}: {}".format(t, sensor_id, rng))
+    except KeyboardInterrupt:
+        bridge.stop()
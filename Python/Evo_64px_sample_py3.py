@@ -5,63 +5,63 @@ import serial
 import crcmod.predefined
 import serial.tools.list_ports
 import threading
+from Evo_transport_py3 import USB_VCP, EVO_64PX_BACKBOARD, FrameReader, open_port, detect_profile
+from Evo_profiling_py3 import LoopProfiler
 
 
 class Evo_64px(object):
 
-    def __init__(self, portname=None):
+    FRAME_HEADER = b"\x11"
+    FRAME_LENGTH = 269
+
+    def __init__(self, portname=None, profile=None):
+        self.crc32 = crcmod.predefined.mkPredefinedCrcFun('crc-32-mpeg')
+        self.crc8 = crcmod.predefined.mkPredefinedCrcFun('crc-8')
         if portname is None:
             ports = list(serial.tools.list_ports.comports())
             for p in ports:
                 if ":5740" in p[2]:
                     print("Evo 64px found on port {}".format(p[0]))
                     portname = p[0]
+                    if profile is None:
+                        profile = USB_VCP
             if portname is None:
                 print("Sensor not found. Please Check connections.")
                 exit()
-        self.portname = portname  # To be adapted if using UART backboard
-        self.baudrate = 115200  # 3000000 for UART backboard
-
-        # Configure the serial connections (the parameters differs on the device you are connecting to)
-        self.port = serial.Serial(
-            port=self.portname,
-            baudrate=self.baudrate,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            bytesize=serial.EIGHTBITS
-        )
-        self.port.isOpen()
-        self.crc32 = crcmod.predefined.mkPredefinedCrcFun('crc-32-mpeg')
-        self.crc8 = crcmod.predefined.mkPredefinedCrcFun('crc-8')
+        if profile is None:
+            # Port given explicitly: probe for the UART backboard, fall back to USB VCP
+            profile = detect_profile(portname, [EVO_64PX_BACKBOARD], Evo_64px.FRAME_HEADER,
+                                     Evo_64px.FRAME_LENGTH, self.check_frame) or USB_VCP
+        print("Using {}".format(profile))
+        self.portname = portname
+        self.profile = profile
+        self.baudrate = profile.baudrate
+
+        # Configure the serial connections, read timeout is sized to the frame time at this baudrate
+        self.port = open_port(self.portname, self.profile, Evo_64px.FRAME_LENGTH)
+        self.reader = FrameReader(self.port, Evo_64px.FRAME_HEADER, Evo_64px.FRAME_LENGTH, self.check_frame,
+                                  usb_vcp=profile.usb_vcp)
         self.serial_lock = threading.Lock()
+        self.profiler = LoopProfiler("evo_64px")  # Profiling window on EVO_PROFILE or SIGUSR1
+
+    def check_frame(self, frame):
+        # Range frames end with a newline, checking it first avoids computing CRCs on header bytes inside data
+        return frame[-1] == 0x0A and self.crc_check(frame, verbose=False)
 
     def get_depth_array(self):
         '''
         This function reads the data from the serial port and returns it as
         an array of 12 bit values with the shape 8x8
         '''
-        got_frame = False
-        while not got_frame:
-            with self.serial_lock:
-                #print(self.port.in_waiting)
-                frame = self.port.readline()
-            if len(frame) == 269:
-                if frame[0] == 0x11 and self.crc_check(frame):  # Check for range frame header and crc
-                    dec_out = []
-                    for i in range(1, 65):
-                        rng = frame[2 * i - 1] << 7
-                        rng = rng | (frame[2 * i] & 0x7F)
-                        dec_out.append(rng & 0x3FFF)
-                    depth_array = [dec_out[i:i + 8] for i in range(0, len(dec_out), 8)]
-                    depth_array = np.array(depth_array)
-                    got_frame = True
-            else:
-                print("Invalid frame length: {}".format(len(frame)))
-
-        depth_array.astype(np.uint16)
+        with self.serial_lock:
+            frame = self.reader.get_frame()
+            self.timestamp = self.reader.timestamp  # Host monotonic time the frame started arriving
+        frame = np.frombuffer(frame, dtype=np.uint8)
+        depth_array = (frame[1:129:2].astype(np.uint16) << 7) | (frame[2:129:2] & 0x7F)
+        depth_array = np.reshape(depth_array & 0x3FFF, (8, 8))
         return depth_array
 
-    def crc_check(self, frame):
+    def crc_check(self, frame, verbose=True):
         index = len(frame) - 9  # Start of CRC
         crc_value = (frame[index] & 0x0F) << 28
         crc_value |= (frame[index + 1] & 0x0F) << 24
@@ -77,7 +77,8 @@ class Evo_64px(object):
         if crc32 == crc_value:
             return True
         else:
-            print("Discarding current buffer because of bad checksum")
+            if verbose:
+                print("Discarding current buffer because of bad checksum")
             return False
 
     def send_command(self, command):
@@ -113,16 +114,17 @@ class Evo_64px(object):
             print("Sensor stopped successfully")
 
     def run(self):
-        self.port.flushInput()
-        if self.baudrate == 115200: # Sending VCP start when connected via USB
+        self.reader.reset()
+        if self.profile.usb_vcp:  # Sending VCP start when connected via USB
             self.start_sensor()
 
         depth_array = []
         while depth_array is not None:
+            self.profiler.tick()
             depth_array = self.get_depth_array()
             print(depth_array)
         else:
-            if self.baudrate == 115200:
+            if self.profile.usb_vcp:
                 self.stop_sensor()  # Sending VCP stop when connected via USB
 
 
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import time
 import serial
 import crcmod.predefined
 import serial.tools.list_ports
 import threading
+from Evo_transport_py3 import arrival_time, is_usb_vcp
+from Evo_profiling_py3 import LoopProfiler
 
 
 class Evo_Mini(object):
@@ -39,21 +42,35 @@ class Evo_Mini(object):
         self.port.isOpen()
         self.crc8 = crcmod.predefined.mkPredefinedCrcFun('crc-8')
         self.serial_lock = threading.Lock()
+        self.profiler = LoopProfiler("evo_mini")  # Profiling window on EVO_PROFILE or SIGUSR1
+        self.timestamp = None  # Host monotonic time the last frame started arriving
+        self.wire_baudrate = None if is_usb_vcp(self.portname) else self.baudrate  # Transfer time compensation
+        self.buffer = b""  # Bytes received while waiting for an ACK, read before the port
+
+    def read(self, size):
+        data = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        if len(data) < size:
+            data += self.port.read(size - len(data))
+        return data
 
     def get_ranges(self):
         # Read one byte
         ranges = []
-        data = self.port.read(1)
+        data = self.read(1)
         if data == b'T':
             # After T read 3 bytes
-            frame = data + self.port.read(3)  # Try a single-range frame
+            frame = data + self.read(3)  # Try a single-range frame
             if frame[-1] != self.crc8(frame[:-1]):
-                frame = frame + self.port.read(2)  # Try a two-range frame
+                frame = frame + self.read(2)  # Try a two-range frame
                 if frame[-1] != self.crc8(frame[:-1]):
-                    frame = frame + self.port.read(4) # Try a two-by-two-range frame
+                    frame = frame + self.read(4) # Try a two-by-two-range frame
                 elif frame[-1] != self.crc8(frame[:-1]):
                     return "CRC mismatch. Check connection or make sure only one progam accesses the sensor port."
 
+            # Frame start: read time minus the wire time of the frame on UART links
+            self.timestamp = arrival_time(time.monotonic(), len(frame), self.wire_baudrate)
+
             # Convert binary frame to decimal in shifting by 8 the frame
             for i in range(int((len(frame) - 2) / 2)):
                 rng = frame[2 * i + 1] << 8
@@ -81,33 +98,48 @@ class Evo_Mini(object):
 
         return range_list
 
-    def send_command(self, command):
+    def send_command(self, command, timeout=1.0):
         with self.serial_lock:  # This avoid concurrent writes/reads of serial
             self.port.write(command)
-            ack = self.port.read(1)
-            # This loop discards buffered frames until an ACK header is reached
-            while ack != b"\x12":
-                ack = self.port.read(1)
-            else:
-                ack += self.port.read(3)
+            response = b""
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                # The port has no read timeout, only bytes already waiting are read so the deadline holds
+                waiting = self.port.in_waiting
+                if not waiting:
+                    time.sleep(0.001)
+                    continue
+                response += self.port.read(waiting)
+                # ACK header followed by a valid crc8, range bytes equal to the header are skipped
+                start = response.find(b"\x12")
+                while start != -1 and start + 4 <= len(response):
+                    if self.crc8(response[start:start + 3]) == response[start + 3]:
+                        break
+                    start = response.find(b"\x12", start + 1)
+                if start == -1 or start + 4 > len(response):
+                    continue
+                ack = response[start:start + 4]
+                # Frames received before and after the ACK are kept for get_ranges
+                self.buffer += response[:start] + response[start + 4:]
 
-            # Check ACK crc8
-            crc8 = self.crc8(ack[:3])
-            if crc8 == ack[3]:
                 # Check if ACK or NACK
                 if ack[2] == 0:
                     return True
                 else:
                     print("Command not acknowledged")
                     return False
-            else:
-                print("Error in ACK checksum")
-                return False
+            self.buffer += response
+            print("No ACK received")
+            return False
 
     def set_binary_mode(self):
         if self.send_command(Evo_Mini.BINARY_MODE):
             print("Sensor succesfully switched to binary mode")
 
+    def set_text_mode(self):
+        if self.send_command(Evo_Mini.TEXT_MODE):
+            print("Sensor succesfully switched to text mode")
+
     def set_two_by_two_pixel_mode(self):
         if self.send_command(Evo_Mini.TWO_BY_TWO_PIXEL_MODE):
             print("Sensor succesfully switched to 2 by 2 ranges measurement")
@@ -143,6 +175,7 @@ class Evo_Mini(object):
 
         ranges = []
         while ranges is not None:
+            self.profiler.tick()
             ranges = self.get_ranges()
             print(ranges)
         else:
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Adaptive range and pixel mode scheduler for TeraRanger Evo Mini.
+
+Short range mode updates about twice as fast as long range mode (see the
+"inter = 25; // replace by 50 if using long mode" delay of the Arduino
+sketches), so the scheduler stays in short range mode while the target is
+close enough and switches to long range mode only when it is needed:
+
+    short -> long : target above switch_up, or above the maximum range (inf)
+    long -> short : target below switch_down, or below the minimum range (-inf)
+
+The pixel mode follows the scene:
+
+    single -> 2x2 : the single range jumps by more than split_spread at least
+                    confirm times within the last window frames (target
+                    partly in the field of view)
+    2x2 -> single : all pixels agree within merge_spread
+
+Range switches and 2x2 -> single need confirm consecutive frames, and every
+switch needs at least min_dwell seconds in the current mode (hysteresis).
+A switch that is not acknowledged is retried after min_dwell at the earliest.
+Out of range readings (inf, -inf) only vote for the range mode, they never
+count as flicker. Frames received while a command is waiting for its ACK are
+kept by Evo_Mini.send_command, so no data is lost on switches.
+
+Usage:
+    python3 Evo_Mini_scheduler_py3.py [port]
+"""
+import sys
+import time
+import numpy as np
+from collections import deque
+from Evo_Mini_py3 import Evo_Mini
+
+SHORT_RANGE = "short"
+LONG_RANGE = "long"
+SINGLE_PIXEL = "single"
+TWO_BY_TWO_PIXEL = "2x2"
+
+COMMANDS = {
+    SHORT_RANGE: Evo_Mini.SHORT_RANGE_MODE,
+    LONG_RANGE: Evo_Mini.LONG_RANGE_MODE,
+    SINGLE_PIXEL: Evo_Mini.SINGLE_PIXEL_MODE,
+    TWO_BY_TWO_PIXEL: Evo_Mini.TWO_BY_TWO_PIXEL_MODE,
+}
+
+
+class ModeScheduler(object):
+
+    def __init__(self, evo_mini, switch_up=1.2, switch_down=0.9, split_spread=0.15, merge_spread=0.05,
+                 window=10, confirm=5, min_dwell=0.5):
+        self.evo_mini = evo_mini
+        self.switch_up = switch_up  # Below the short range maximum, so the target is not lost first
+        self.switch_down = switch_down
+        self.split_spread = split_spread
+        self.merge_spread = merge_spread
+        self.confirm = confirm
+        self.min_dwell = min_dwell
+        self.history = deque(maxlen=window)  # Recent finite single pixel ranges
+        self.range_mode = None
+        self.pixel_mode = None
+        self.range_votes = 0
+        self.pixel_votes = 0
+        self.range_switch_time = 0.0
+        self.pixel_switch_time = 0.0
+
+    def set_mode(self, mode):
+        ### Votes and dwell restart on failure too, so a NACK is retried after min_dwell, not every frame ###
+        acknowledged = self.evo_mini.send_command(COMMANDS[mode])
+        now = time.monotonic()
+        if mode in (SHORT_RANGE, LONG_RANGE):
+            if acknowledged:
+                self.range_mode = mode
+            self.range_switch_time = now
+            self.range_votes = 0
+        else:
+            if acknowledged:
+                self.pixel_mode = mode
+            self.pixel_switch_time = now
+            self.pixel_votes = 0
+            self.history.clear()
+        if acknowledged:
+            print("Evo Mini switched to {} mode".format(mode))
+        return acknowledged
+
+    def start(self, range_mode=SHORT_RANGE, pixel_mode=SINGLE_PIXEL):
+        self.evo_mini.port.flushInput()
+        self.evo_mini.set_binary_mode()  # Binary frames are required by get_ranges
+        self.set_mode(range_mode)
+        self.set_mode(pixel_mode)
+
+    def target(self, ranges):
+        '''
+        Closest target of a frame: -inf if any pixel is below the minimum range,
+        inf if every measuring pixel is above the maximum range, nan if none measures
+        '''
+        ranges = np.asarray(ranges, dtype=np.float64)
+        ranges = ranges[~np.isnan(ranges)]
+        if len(ranges) == 0:
+            return float('nan')
+        return float(ranges.min())
+
+    def update(self, ranges):
+        '''
+        Feeds one frame from get_ranges() and switches modes when needed.
+        Returns True if a mode was switched.
+        '''
+        target = self.target(ranges)
+        now = time.monotonic()
+        switched = False
+
+        ### Range mode: fastest mode that covers the target ###
+        if not np.isnan(target):  # Frames where no pixel measures carry no information
+            if self.range_mode == SHORT_RANGE:
+                wrong = target > self.switch_up
+            else:
+                wrong = target < self.switch_down
+            self.range_votes = self.range_votes + 1 if wrong else 0
+            if self.range_votes >= self.confirm and now - self.range_switch_time >= self.min_dwell:
+                switched |= self.set_mode(LONG_RANGE if self.range_mode == SHORT_RANGE else SHORT_RANGE)
+
+        ### Pixel mode: 2x2 while the target does not fill the field of view ###
+        if self.pixel_mode == SINGLE_PIXEL:
+            ### A target partly in view makes the range flicker, a moving target only steps ###
+            ### Out of range readings are left to the range mode vote ###
+            if np.isfinite(ranges[0]):
+                self.history.append(ranges[0])
+            jumps = np.count_nonzero(np.abs(np.diff(np.array(self.history))) > self.split_spread)
+            change = jumps >= self.confirm
+        else:
+            ### All pixels agreeing, or none measuring, means one range is enough ###
+            finite = np.isfinite(ranges)
+            agree = not np.any(finite) or (np.all(finite) and np.ptp(ranges) <= self.merge_spread)
+            self.pixel_votes = self.pixel_votes + 1 if agree else 0
+            change = self.pixel_votes >= self.confirm
+        if change and now - self.pixel_switch_time >= self.min_dwell:
+            switched |= self.set_mode(TWO_BY_TWO_PIXEL if self.pixel_mode == SINGLE_PIXEL else SINGLE_PIXEL)
+        return switched
+
+    def __iter__(self):
+        '''
+        Yields (timestamp, ranges, range mode, pixel mode) for every frame
+        '''
+        while True:
+            ranges = self.evo_mini.get_ranges()
+            if not isinstance(ranges, list):  # Strings are status messages
+                continue
+            yield self.evo_mini.timestamp, ranges, self.range_mode, self.pixel_mode
+            self.update(ranges)
+
+
+if __name__ == "__main__":
+    sensor = Evo_Mini(sys.argv[1] if len(sys.argv) > 1 else None)
+    scheduler = ModeScheduler(sensor)
+    scheduler.start()
+    frames = 0
+    last_report = time.monotonic()
+    try:
+        for timestamp, ranges, range_mode, pixel_mode in scheduler:
+            frames += 1
+            now = time.monotonic()
+            if now - last_report >= 1.0:
+                print("{} {} {:.1f} Hz {}".format(range_mode, pixel_mode, frames / (now - last_report), ranges))
+                frames = 0
+                last_report = now
+    except KeyboardInterrupt:
+        sensor.port.close()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class BackgroundModel(object):
+    '''
+    Per-pixel running mean/variance background model for the 32x32 celsius
+    array returned by EvoThermal.get_thermals().
+    apply() returns a foreground mask and a "frame changed" flag so that
+    rendering, recording and analysis can skip frames of a static scene.
+    '''
+
+    def __init__(self, alpha=0.05, absorb_alpha=0.002, k_sigma=3.0, min_delta=0.5, min_std=0.2,
+                 min_pixels=2, heartbeat=0, shape=(32, 32)):
+        self.alpha = alpha  # Learning rate of the running mean/variance
+        self.absorb_alpha = absorb_alpha  # Slow rate so objects left in the scene become background
+        self.k_sigma = k_sigma  # Foreground if |T - mean| > k_sigma * std ...
+        self.min_delta = min_delta  # ... and above this many degrees
+        self.min_var = np.float32(min_std * min_std)  # Floor for the noise estimate
+        self.min_pixels = min_pixels  # Foreground pixels needed to flag a change
+        self.heartbeat = heartbeat  # Pass one unchanged frame every N frames, 0 to disable
+        self.shape = shape
+        self.reset()
+
+    def reset(self):
+        self.mean = None
+        self.var = np.full(self.shape, self.min_var, dtype=np.float32)
+        self.mask = np.zeros(self.shape, dtype=bool)
+        self.unchanged_count = 0
+        self.foreground_pixels = 0
+
+    def apply(self, data):
+        '''
+        Updates the model with one frame and returns (foreground_mask, changed).
+        The mask is a copy, callers may keep it across frames.
+        The first frame initializes the model and is always reported as changed.
+        '''
+        data = np.asarray(data, dtype=np.float32)
+        if self.mean is None:
+            self.mean = data.copy()
+            self.mask[:] = False
+            self.unchanged_count = 0
+            self.foreground_pixels = 0
+            return self.mask.copy(), True
+
+        diff = data - self.mean
+        np.greater(diff * diff, np.maximum(self.k_sigma * self.k_sigma * self.var,
+                                           self.min_delta * self.min_delta), out=self.mask)
+
+        ### Foreground pixels are learnt much slower, so moving objects are not absorbed ###
+        rate = np.where(self.mask, np.float32(self.absorb_alpha), np.float32(self.alpha))
+        self.mean += rate * diff
+        self.var += np.where(self.mask, np.float32(0.0), rate) * (diff * diff - self.var)
+        np.maximum(self.var, self.min_var, out=self.var)
+
+        ### A frame where foreground disappears is a change too, so consumers see the scene settle ###
+        foreground_pixels = int(np.count_nonzero(self.mask))
+        changed = max(foreground_pixels, self.foreground_pixels) >= self.min_pixels
+        self.foreground_pixels = foreground_pixels
+        if changed:
+            self.unchanged_count = 0
+        else:
+            self.unchanged_count += 1
+        return self.mask.copy(), changed
+
+    def should_process(self, changed):
+        '''
+        Thinning decision for downstream stages: changed frames always pass,
+        unchanged frames pass once every heartbeat frames (never if 0).
+        '''
+        if changed:
+            return True
+        return self.heartbeat > 0 and self.unchanged_count % self.heartbeat == 0
+
+    def filter(self, frames):
+        '''
+        Generator over a recording of shape (N, 32, 32): yields
+        (index, frame, mask, changed) for the frames should_process() keeps.
+        '''
+        for i, data in enumerate(frames):
+            mask, changed = self.apply(data)
+            if self.should_process(changed):
+                yield i, data, mask, changed
+
+
+if __name__ == "__main__":
+    from Evo_Thermal_sample_py3 import EvoThermal
+    evo = EvoThermal()
+    model = BackgroundModel(heartbeat=50)
+    frames = 0
+    processed = 0
+    try:
+        while True:
+            data = evo.get_thermals()
+            mask, changed = model.apply(data)
+            frames += 1
+            if model.should_process(changed):
+                processed += 1
+                print("Frame {}: changed={}, {} foreground pixels, {}/{} frames processed".format(
+                    frames, changed, np.count_nonzero(mask), processed, frames))
+    except KeyboardInterrupt:
+        evo.stop()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+import time
+import numpy as np
+import cv2
+
+
+class Hotspot(object):
+    def __init__(self, x, y, peak, mean, area):
+        self.x = x  # Sub-pixel centroid, in sensor pixels (0..31)
+        self.y = y
+        self.peak = peak  # Hottest pixel of the blob in celsius
+        self.mean = mean
+        self.area = area  # Number of pixels above threshold
+
+    def __repr__(self):
+        return "Hotspot(x={:.2f}, y={:.2f}, peak={:.1f}C, area={})".format(self.x, self.y, self.peak, self.area)
+
+
+class Track(object):
+    def __init__(self, track_id, hotspot):
+        self.id = track_id
+        self.x = hotspot.x
+        self.y = hotspot.y
+        self.vx = 0.0
+        self.vy = 0.0
+        self.hotspot = hotspot
+        self.hits = 1
+        self.misses = 0
+
+    def predict(self):
+        ### Constant velocity prediction, in pixels per frame ###
+        return self.x + self.vx, self.y + self.vy
+
+    def update(self, hotspot):
+        self.vx = hotspot.x - self.x
+        self.vy = hotspot.y - self.y
+        self.x = hotspot.x
+        self.y = hotspot.y
+        self.hotspot = hotspot
+        self.hits += 1
+        self.misses = 0
+
+    def coast(self):
+        self.x, self.y = self.predict()
+        self.misses += 1
+
+    def __repr__(self):
+        return "Track(id={}, x={:.2f}, y={:.2f}, hits={}, misses={})".format(self.id, self.x, self.y,
+                                                                            self.hits, self.misses)
+
+
+class HotspotTracker(object):
+    '''
+    Detects and tracks hot objects on the native 32x32 celsius array returned
+    by EvoThermal.get_thermals(), instead of the 600x600 upscaled GUI image.
+    '''
+
+    def __init__(self, threshold=35.0, min_area=1, max_area=256, max_hotspots=16, max_distance=4.0,
+                 max_misses=5, time_budget=0.010):
+        self.threshold = threshold  # Celsius
+        self.min_area = min_area  # Pixels
+        self.max_area = max_area  # Pixels labelled per frame, the hottest ones are kept
+        self.max_hotspots = max_hotspots  # Bounds the size of the cost matrix
+        self.max_distance = max_distance  # Pixels, gate for track association
+        self.max_misses = max_misses  # Frames a track can coast before deletion
+        self.time_budget = time_budget  # Seconds per frame, None to disable
+        self.tracks = []
+        self.next_id = 0
+        self.overruns = 0  # Frames that took longer than time_budget
+        self.area_limit = max_area  # Pixels labelled in the next frame, lowered after overruns
+        self.min_area_limit = max(1, min(max_area, min_area * max_hotspots))
+
+        ### Pixel coordinates, computed once for centroid weighting ###
+        self.ys, self.xs = np.indices((32, 32), dtype=np.float64)
+
+    def detect(self, data, max_area=None):
+        '''
+        Threshold + connected components labelling. Returns hotspots sorted
+        by peak temperature, at most max_hotspots of them.
+        When more than max_area pixels are above the threshold (warm scene),
+        the threshold is raised so only the max_area hottest pixels are labelled.
+        '''
+        if max_area is None:
+            max_area = self.max_area
+        threshold = self.threshold
+        flat = data.ravel()
+        if np.count_nonzero(flat > threshold) > max_area:
+            kth = flat.size - max_area - 1
+            threshold = max(threshold, float(np.partition(flat, kth)[kth]))
+        mask = (data > threshold).astype(np.uint8)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if count <= 1:
+            return []
+
+        ### Temperature weighted centroids for all blobs at once (label 0 is background) ###
+        labels = labels.ravel()
+        weights = np.where(labels > 0, data.ravel() - threshold, 0.0)
+        sum_w = np.bincount(labels, weights, minlength=count)
+        sum_x = np.bincount(labels, weights * self.xs.ravel(), minlength=count)
+        sum_y = np.bincount(labels, weights * self.ys.ravel(), minlength=count)
+        sum_t = np.bincount(labels, data.ravel(), minlength=count)
+        peaks = np.full(count, -np.inf)
+        np.maximum.at(peaks, labels, data.ravel())
+        areas = stats[:, cv2.CC_STAT_AREA]
+
+        blobs = np.arange(1, count)
+        blobs = blobs[areas[blobs] >= self.min_area]
+        blobs = blobs[np.argsort(-peaks[blobs])][:self.max_hotspots]
+
+        hotspots = []
+        for i in blobs:
+            hotspots.append(Hotspot(float(sum_x[i] / sum_w[i]), float(sum_y[i] / sum_w[i]), float(peaks[i]),
+                                    float(sum_t[i] / areas[i]), int(areas[i])))
+        return hotspots
+
+    def associate(self, hotspots):
+        '''
+        Greedy assignment on the track/hotspot distance matrix: the cheapest
+        pair is matched first. Matrices are at most max_hotspots wide.
+        '''
+        if not self.tracks or not hotspots:
+            return [], list(range(len(self.tracks))), list(range(len(hotspots)))
+
+        predicted = np.array([t.predict() for t in self.tracks])
+        detected = np.array([(h.x, h.y) for h in hotspots])
+        cost = np.hypot(predicted[:, 0, None] - detected[None, :, 0],
+                        predicted[:, 1, None] - detected[None, :, 1])
+        cost[cost > self.max_distance] = np.inf
+
+        matches = []
+        for flat in np.argsort(cost, axis=None):
+            t, h = np.unravel_index(flat, cost.shape)
+            if not np.isfinite(cost[t, h]):
+                break
+            matches.append((t, h))
+            cost[t, :] = np.inf
+            cost[:, h] = np.inf
+
+        matched_tracks = set(t for t, _ in matches)
+        matched_hotspots = set(h for _, h in matches)
+        unmatched_tracks = [t for t in range(len(self.tracks)) if t not in matched_tracks]
+        unmatched_hotspots = [h for h in range(len(hotspots)) if h not in matched_hotspots]
+        return matches, unmatched_tracks, unmatched_hotspots
+
+    def update(self, data, budget=True):
+        '''
+        Processes one 32x32 celsius frame and returns the list of live tracks.
+        The work per frame is bounded by max_area and max_hotspots. A frame
+        exceeding the time budget is counted in overruns and halves the pixels
+        labelled in the next frames, frames within budget raise it back
+        towards max_area.
+        '''
+        start = time.perf_counter()
+        hotspots = self.detect(data, self.area_limit if budget else self.max_area)
+        matches, unmatched_tracks, unmatched_hotspots = self.associate(hotspots)
+        for t, h in matches:
+            self.tracks[t].update(hotspots[h])
+        for t in unmatched_tracks:
+            self.tracks[t].coast()
+        for h in unmatched_hotspots:
+            self.tracks.append(Track(self.next_id, hotspots[h]))
+            self.next_id += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        if budget and self.time_budget is not None:
+            if time.perf_counter() - start > self.time_budget:
+                self.overruns += 1
+                self.area_limit = max(self.min_area_limit, self.area_limit // 2)
+            else:
+                self.area_limit = min(self.max_area, self.area_limit + max(1, self.max_area // 8))
+        return self.tracks
+
+    def process_batch(self, frames):
+        '''
+        Runs the tracker over a recording of shape (N, 32, 32) in celsius,
+        without the time budget.
+        Returns one list of (track_id, x, y, peak) tuples per frame.
+        '''
+        results = []
+        for data in np.asarray(frames, dtype=np.float64):
+            tracks = self.update(data, budget=False)
+            results.append([(t.id, t.x, t.y, t.hotspot.peak) for t in tracks if t.misses == 0])
+        return results
+
+
+if __name__ == "__main__":
+    tracker = HotspotTracker()
+    if len(sys.argv) > 1:
+        ### Batch mode on a recording saved with numpy.save, shape (N, 32, 32) in celsius ###
+        frames = np.load(sys.argv[1])
+        for i, tracks in enumerate(tracker.process_batch(frames)):
+            print(i, tracks)
+    else:
+        from Evo_Thermal_sample_py3 import EvoThermal
+        evo = EvoThermal()
+        try:
+            while True:
+                tracks = tracker.update(evo.get_thermals())
+                print([t for t in tracks if t.misses == 0])
+        except KeyboardInterrupt:
+            evo.stop()
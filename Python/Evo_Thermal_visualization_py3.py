@@ -7,39 +7,50 @@ import serial
 from struct import unpack
 import serial.tools.list_ports
 import threading
+from Evo_transport_py3 import USB_VCP, THERMAL_BACKBOARD, FrameReader, open_port, detect_profile
+from Evo_profiling_py3 import LoopProfiler
 from PIL import Image, ImageTk
 import tkinter as Tk
 import cv2
 
 
 class EvoThermal():
-    def __init__(self):
-        ### Search for Evo Thermal port and open it ###
-        ports = list(serial.tools.list_ports.comports())
-        portname = None
-        for p in ports:
-            if ":5740" in p[2]:
-                print("EvoThermal found on port " + p[0])
-                portname = p[0]
-        if portname is None:
-            print("Sensor not found. Please Check connections.")
-            exit()
-        self.port = serial.Serial(
-                            port=portname,  # To be adapted if using UART backboard
-                            baudrate=115200, # 460800 for UART backboard
-                            parity=serial.PARITY_NONE,
-                            stopbits=serial.STOPBITS_ONE,
-                            bytesize=serial.EIGHTBITS
-                            )
-        self.port.isOpen()
-        self.serial_lock = threading.Lock()
+    FRAME_HEADER = b"\x0d\x00"
+    FRAME_LENGTH = 2070
+
+    def __init__(self, portname=None, profile=None):
         ### CRC functions ###
         self.crc32 = crcmod.predefined.mkPredefinedCrcFun('crc-32-mpeg')
         self.crc8 = crcmod.predefined.mkPredefinedCrcFun('crc-8')
+        ### Search for Evo Thermal port and open it ###
+        if portname is None:
+            ports = list(serial.tools.list_ports.comports())
+            for p in ports:
+                if ":5740" in p[2]:
+                    print("EvoThermal found on port " + p[0])
+                    portname = p[0]
+                    if profile is None:
+                        profile = USB_VCP
+            if portname is None:
+                print("Sensor not found. Please Check connections.")
+                exit()
+        if profile is None:
+            ### Port given explicitly: probe for the UART backboard, fall back to USB VCP ###
+            profile = detect_profile(portname, [THERMAL_BACKBOARD], EvoThermal.FRAME_HEADER,
+                                     EvoThermal.FRAME_LENGTH, self.check_frame) or USB_VCP
+        print("Using {}".format(profile))
+        self.profile = profile
+        self.port = open_port(portname, profile, EvoThermal.FRAME_LENGTH)
+        self.reader = FrameReader(self.port, EvoThermal.FRAME_HEADER, EvoThermal.FRAME_LENGTH, self.check_frame,
+                                  usb_vcp=profile.usb_vcp)
+        self.serial_lock = threading.Lock()
+        ### Profiling window of the run loop, opened by EVO_PROFILE or SIGUSR1 ###
+        self.profiler = LoopProfiler("evo_thermal")
         ### Activate sensor USB output ###
         self.activate_command   = (0x00, 0x52, 0x02, 0x01, 0xDF)
         self.deactivate_command = (0x00, 0x52, 0x02, 0x00, 0xD8)
-        self.send_command(self.activate_command)
+        if self.profile.usb_vcp:
+            self.send_command(self.activate_command)
 
         ### Visualization window ###
         self.activate_visualization = True
@@ -95,31 +106,21 @@ class EvoThermal():
         im = im.resize(size=(self.canvas_width, self.canvas_height), resample=Image.NEAREST)
         return im
 
+    def check_frame(self, frame):
+        ### Calculate CRC for frame (except header and CRC value) ###
+        calculatedCRC = self.crc32(frame[2:2066])
+        receivedCRC = unpack("<HH", frame[2066:2070])
+        receivedCRC = (receivedCRC[0] & 0xFFFF) << 16 | (receivedCRC[1] & 0xFFFF)
+        return calculatedCRC == receivedCRC
+
     def get_thermals(self):
-        got_frame = False
-        while not got_frame:
-            with self.serial_lock:
-                ### Polls for header ###
-                header = self.port.read(2)
-                # header = unpack('H', str(header))
-                header = unpack('H', header)
-                if header[0] == 13:
-                    ### Header received, now read rest of frame ###
-                    data = self.port.read(2068)
-                    ### Calculate CRC for frame (except CRC value and header) ###
-                    calculatedCRC = self.crc32(data[:2064])
-                    data = unpack("H" * 1034, data)
-                    receivedCRC = (data[1032] & 0xFFFF ) << 16
-                    receivedCRC |= data[1033] & 0xFFFF
-                    TA = data[1024],
-                    data = data[:1024],
-                    data = np.reshape(data, (32, 32))
-                    ### Compare calculated CRC to received CRC ###
-                    if calculatedCRC == receivedCRC:
-                        got_frame = True
-                    else:
-                        print("Bad CRC. Dropping frame")
-        self.port.flushInput()
+        ### Block read of everything waiting, keeping only the most recent valid frame ###
+        with self.serial_lock:
+            frame = self.reader.get_latest_frame()
+            self.timestamp = self.reader.timestamp  # Host monotonic time the frame started arriving
+        data = np.frombuffer(frame, dtype="<u2", offset=2)
+        TA = data[1024]
+        data = np.reshape(data[:1024], (32, 32))
         ### Data is sent in dK, this converts it to celsius ###
         data = (data/10.0) - 273.15
 
@@ -155,7 +156,7 @@ class EvoThermal():
             self.port.write(command)
             ack = self.port.read(1)
             ### This loop discards buffered frames until an ACK header is reached ###
-            while ord(ack) != 20:
+            while ack != b"\x14":
                 ack = self.port.read(1)
             else:
                 ack += self.port.read(3)
@@ -174,6 +175,7 @@ class EvoThermal():
                 return False
 
     def run(self):
+        self.profiler.tick()
         ### Get frame and print it ###
         frame = self.get_thermals()
         self.rounded_array = np.round(frame, 0)
@@ -181,7 +183,8 @@ class EvoThermal():
 
     def stop(self):
         ### Deactivate USB VCP output and close port ###
-        self.send_command(self.deactivate_command)
+        if self.profile.usb_vcp:
+            self.send_command(self.deactivate_command)
         self.port.close()
 
 
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Joins streams of Evo sensors running at different rates on a common timebase.
+
+Every stream keeps its most recent samples in a fixed size numpy ring buffer
+of (timestamp, value) pairs, the timestamps being the host monotonic arrival
+times set by the drivers (EvoThermal.timestamp, Evo_64px.timestamp,
+Evo_Mini.timestamp, Multiflex.timestamps). Lookups for a whole array of query
+times are done with a single np.searchsorted per stream:
+
+    - nearest : value of the closest sample in time
+    - linear  : interpolation between the samples around each query time,
+                falling back to the nearest sample when one of them is a
+                special value (inf, -inf or nan from check_ranges)
+
+Query times farther than max_gap from the samples used give nan.
+
+Usage:
+    python3 Evo_alignment_py3.py <Evo Mini port> <Evo 64px port>
+"""
+import sys
+import time
+import threading
+import numpy as np
+
+
+class RingBuffer(object):
+
+    def __init__(self, capacity, shape=(), dtype=np.float64):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity,) + self.shape, dtype=dtype)
+        self.count = 0  # Samples appended since creation
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, value):
+        self.extend([timestamp], np.asarray(value)[None])
+
+    def extend(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values).reshape((len(timestamps),) + self.shape)
+        if len(timestamps) > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+        with self.lock:
+            ### Keep timestamps sorted for searchsorted, arrival estimates can step back slightly ###
+            if self.count:
+                timestamps = np.maximum(timestamps, self.times[(self.count - 1) % self.capacity])
+            timestamps = np.maximum.accumulate(timestamps)
+            index = (self.count + np.arange(len(timestamps))) % self.capacity
+            self.times[index] = timestamps
+            self.values[index] = values
+            self.count += len(timestamps)
+
+    def ordered(self):
+        '''
+        Returns copies of (times, values) in chronological order
+        '''
+        with self.lock:
+            if self.count <= self.capacity:
+                return self.times[:self.count].copy(), self.values[:self.count].copy()
+            head = self.count % self.capacity
+            return (np.concatenate((self.times[head:], self.times[:head])),
+                    np.concatenate((self.values[head:], self.values[:head])))
+
+
+class StreamAligner(object):
+
+    def __init__(self):
+        self.streams = {}
+
+    def add_stream(self, name, capacity, shape=(), dtype=np.float64):
+        self.streams[name] = RingBuffer(capacity, shape, dtype)
+        return self.streams[name]
+
+    def append(self, name, timestamp, value):
+        self.streams[name].append(timestamp, value)
+
+    def extend(self, name, timestamps, values):
+        self.streams[name].extend(timestamps, values)
+
+    def sample(self, name, times, method="nearest", max_gap=None):
+        '''
+        Returns the values of a stream at the given times as a float
+        (N,) + shape array, nan where no sample is close enough
+        '''
+        times = np.asarray(times, dtype=np.float64)
+        stream_times, values = self.streams[name].ordered()
+        result_shape = (len(times),) + self.streams[name].shape
+        if len(stream_times) == 0:
+            return np.full(result_shape, np.nan)
+        values = values.astype(np.float64)
+        last = len(stream_times) - 1
+        expand = (slice(None),) + (None,) * len(self.streams[name].shape)
+
+        ### Samples around each query time: right is the first sample at or after it ###
+        right = np.searchsorted(stream_times, times)
+        left = np.clip(right - 1, 0, last)
+        right = np.clip(right, 0, last)
+        closest = np.where(np.abs(stream_times[right] - times) < np.abs(times - stream_times[left]), right, left)
+        result = values[closest]
+
+        if method == "nearest":
+            invalid = np.zeros(len(times), dtype=bool)
+            if max_gap is not None:
+                invalid = np.abs(stream_times[closest] - times) > max_gap
+        elif method == "linear":
+            span = stream_times[right] - stream_times[left]
+            weight = np.divide(times - stream_times[left], span, out=np.zeros(len(times)), where=span > 0)
+            with np.errstate(invalid="ignore"):
+                interpolated = values[left] + weight[expand] * (values[right] - values[left])
+            special = ~(np.isfinite(values[left]) & np.isfinite(values[right]))
+            result = np.where(special, result, interpolated)
+            invalid = (times < stream_times[0]) | (times > stream_times[-1])
+            if max_gap is not None:
+                invalid |= span > max_gap
+        else:
+            raise ValueError("Unknown alignment method {}".format(method))
+
+        result[invalid] = np.nan
+        return result
+
+    def align(self, times, method="nearest", max_gap=None):
+        ''' Samples every stream at the given times, returns {name: values} '''
+        return {name: self.sample(name, times, method, max_gap) for name in self.streams}
+
+    def resample(self, period, start=None, stop=None, method="linear", max_gap=None):
+        '''
+        Samples every stream on a regular timebase, by default over the
+        interval covered by all streams. Returns (times, {name: values}).
+        '''
+        ranges = [stream.ordered()[0] for stream in self.streams.values()]
+        ranges = [t for t in ranges if len(t)]
+        if start is None:
+            start = max(t[0] for t in ranges) if ranges else 0.0
+        if stop is None:
+            stop = min(t[-1] for t in ranges) if ranges else 0.0
+        times = np.arange(start, stop, period)
+        return times, self.align(times, method, max_gap)
+
+    def join(self, reference, method="nearest", max_gap=None):
+        '''
+        Samples every stream at the timestamps of the reference stream,
+        e.g. the slowest sensor. Returns (times, {name: values}).
+        '''
+        times, _ = self.streams[reference].ordered()
+        return times, self.align(times, method, max_gap)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print('\n[ERROR] Correct usage $ python3 Evo_alignment_py3.py mini_port 64px_port')
+        sys.exit(1)
+
+    from Evo_Mini_py3 import Evo_Mini
+    from Evo_64px_sample_py3 import Evo_64px
+
+    aligner = StreamAligner()
+    aligner.add_stream("mini", 1000)
+    aligner.add_stream("64px", 200, (8, 8))
+
+    mini = Evo_Mini(sys.argv[1])
+    mini.set_binary_mode()
+    mini.set_single_pixel_mode()
+    evo_64px = Evo_64px(sys.argv[2])
+    evo_64px.reader.reset()
+    if evo_64px.profile.usb_vcp:  # Sending VCP start when connected via USB
+        evo_64px.start_sensor()
+
+    def read_mini():
+        while True:
+            ranges = mini.get_ranges()
+            if isinstance(ranges, list):  # Strings are status messages
+                aligner.append("mini", mini.timestamp, ranges[0])
+
+    def read_64px():
+        while True:
+            depth_array = evo_64px.get_depth_array()
+            aligner.append("64px", evo_64px.timestamp, depth_array / 1000.0)
+
+    for target in (read_mini, read_64px):
+        threading.Thread(target=target, daemon=True).start()
+
+    try:
+        while True:
+            time.sleep(1.0)
+            ### Evo Mini range at each 64px frame, next to the central pixels of the frame ###
+            times, values = aligner.join("64px", method="linear", max_gap=0.1)
+            for t, rng, depth in zip(times[-5:], values["mini"][-5:], values["64px"][-5:]):
+                print("{:.4f} mini {:.3f} 64px {:.3f}".format(t, rng, np.nanmean(depth[3:5, 3:5])))
+    except KeyboardInterrupt:
+        if evo_64px.profile.usb_vcp:
+            evo_64px.stop_sensor()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized decoding helpers shared by the readers of crc8 framed binary
+output (Multiflex_py3, Arduino_bridge_reader_py3) and of text output
+(Evo_text_mode_py3).
+"""
+import numpy as np
+import crcmod.predefined
+
+
+def crc8_table():
+    ''' CRC-8 lookup table, so CRCs of many frames are computed in one pass '''
+    crc8 = crcmod.predefined.mkPredefinedCrcFun('crc-8')
+    return np.array([crc8(bytes([i])) for i in range(256)], dtype=np.uint8)
+
+
+def scan_frames(data, header, length, table):
+    '''
+    Finds every frame of length bytes starting with header and ending with
+    the crc8 of the bytes before it. Returns (starts, frames, consumed):
+    frame offsets in data, a (N, length) uint8 array of frames and the number
+    of bytes that can be dropped, the rest possibly holding an incomplete frame.
+    '''
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    ### Candidate frame starts: every header with a full frame behind it ###
+    last = len(buf) - length + 1
+    candidates = np.ones(max(0, last), dtype=bool)
+    for k, byte in enumerate(header):
+        candidates &= buf[k:k + len(candidates)] == byte
+    starts = np.flatnonzero(candidates)
+    frames = buf[starts[:, None] + np.arange(length)]
+
+    crc = np.zeros(len(frames), dtype=np.uint8)
+    for column in range(length - 1):
+        crc = table[crc ^ frames[:, column]]
+    valid = crc == frames[:, length - 1]
+    starts = starts[valid]
+    frames = frames[valid]
+
+    ### Drop candidates overlapping a previous valid frame (e.g. a header inside range bytes) ###
+    keep = np.ones(len(starts), dtype=bool)
+    end = 0
+    for i, start in enumerate(starts):
+        if start < end:
+            keep[i] = False
+        else:
+            end = start + length
+    consumed = max(end, len(buf) - (length - 1))
+    return starts[keep], frames[keep], consumed
+
+
+def check_ranges(raw):
+    ''' Same sentinel mapping as Evo_Mini.check_ranges, for whole arrays of mm values '''
+    ranges = raw / 1000.0
+    ranges[raw == 65535] = float('inf')  # Sensor measuring above its maximum limit
+    ranges[raw == 1] = float('nan')  # Sensor not able to measure
+    ranges[raw == 0] = -float('inf')  # Sensor detecting object below minimum range
+    return ranges
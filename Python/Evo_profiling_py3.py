@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-demand profiling of the driver run() loops (EvoThermal, Evo_64px, Evo_Mini).
+
+A profiling window is opened either at start up, by setting EVO_PROFILE to
+the window length in seconds, or at runtime by sending SIGUSR1 to the process
+for a 10 s window (a second SIGUSR1 closes the window early):
+
+    EVO_PROFILE=10 python3 Evo_Thermal_visualization_py3.py
+    kill -USR1 <pid>
+
+During the window the loop thread is profiled and tracemalloc traces
+allocations. When it closes, these files are written to EVO_PROFILE_DIR
+(default: current directory):
+
+    <name>_<time>.collapsed    sampled stacks, one "f1;f2;f3 count" line per
+                               stack (flamegraph.pl / speedscope input), or
+    <name>_<time>.pstats       cProfile statistics when EVO_PROFILE_FORMAT=pstats
+    <name>_<time>.tracemalloc  allocation snapshot (tracemalloc.Snapshot.load)
+    <name>_<time>.txt          loop rate and top allocation growth over the window
+
+Outside a window the loops only pay for LoopProfiler.tick() checking two flags.
+"""
+import os
+import sys
+import time
+import signal
+import threading
+import tracemalloc
+import cProfile
+from collections import Counter
+
+COLLAPSED = "collapsed"
+PSTATS = "pstats"
+DEFAULT_DURATION = 10.0  # Seconds, for SIGUSR1 windows and invalid EVO_PROFILE values
+
+_profilers = []  # Every LoopProfiler of the process, toggled together by the signal
+
+
+def _toggle(signum, frame):
+    for profiler in _profilers:
+        profiler.toggle()
+
+
+def take_snapshot():
+    ### Allocations of the profiler itself are left out ###
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def startup_duration():
+    ''' Window length requested by EVO_PROFILE, None when it is not set '''
+    value = os.environ.get("EVO_PROFILE")
+    if not value:
+        return None
+    try:
+        duration = float(value)
+    except ValueError:
+        duration = 0.0
+    if not duration > 0.0:  # Also rejects nan
+        print("EVO_PROFILE={} is not a window length in seconds, using {:.1f} s".format(value, DEFAULT_DURATION))
+        return DEFAULT_DURATION
+    return duration
+
+
+def install_signal_handler(signum=getattr(signal, "SIGUSR1", None)):
+    ''' Returns False where the signal is not available (Windows) or not in the main thread '''
+    if signum is None:
+        return False
+    try:
+        signal.signal(signum, _toggle)
+    except ValueError:
+        return False
+    return True
+
+
+class StackSampler(object):
+    '''
+    Samples the stack of one thread at a fixed interval from a background
+    thread and counts identical stacks
+    '''
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+class LoopProfiler(object):
+
+    def __init__(self, name, duration=None, signal_duration=DEFAULT_DURATION, output_format=None, directory=None,
+                 interval=0.005, top=25):
+        self.name = name
+        startup = startup_duration()
+        self.duration = duration or startup or DEFAULT_DURATION  # Start up window
+        self.signal_duration = signal_duration  # Windows opened by SIGUSR1
+        self.output_format = output_format or os.environ.get("EVO_PROFILE_FORMAT", COLLAPSED)
+        self.directory = directory or os.environ.get("EVO_PROFILE_DIR", ".")
+        self.interval = interval  # Stack sampling period
+        self.top = top  # Allocation sites reported in the summary
+        self.requested = startup is not None
+        self.window = self.duration  # Length of the next window
+        self.active = False
+        _profilers.append(self)
+        install_signal_handler()
+
+    def toggle(self):
+        ### Only flags are set here, the window is opened and closed by the loop thread in tick() ###
+        if self.active:
+            self.deadline = 0.0
+        else:
+            self.window = self.signal_duration
+            self.requested = True
+
+    def tick(self):
+        ''' Called once per loop iteration '''
+        if not (self.requested or self.active):
+            return
+        if not self.active:
+            self.start()
+        elif time.monotonic() >= self.deadline:
+            self.stop()
+        else:
+            self.iterations += 1
+
+    def start(self):
+        self.requested = False
+        self.active = True
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start(25)
+        self.first_snapshot = take_snapshot()
+        if self.output_format == PSTATS:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident(), self.interval)
+            self.sampler.start()
+        self.iterations = 0
+        self.start_time = time.monotonic()
+        self.deadline = self.start_time + self.window
+        print("Profiling {} for {:.1f} s".format(self.name, self.window))
+
+    def stop(self):
+        elapsed = time.monotonic() - self.start_time
+        if self.output_format == PSTATS:
+            self.profile.disable()
+        else:
+            self.sampler.stop()
+        snapshot = take_snapshot()
+        if self.started_tracing:
+            tracemalloc.stop()
+        self.active = False
+
+        base = os.path.join(self.directory, "{}_{}".format(self.name, time.strftime("%Y%m%d_%H%M%S")))
+        if self.output_format == PSTATS:
+            self.profile.dump_stats(base + ".pstats")
+        else:
+            self.sampler.write(base + ".collapsed")
+        snapshot.dump(base + ".tracemalloc")
+        with open(base + ".txt", "w") as f:
+            f.write("{} iterations in {:.3f} s ({:.2f} per second)\n\n".format(
+                self.iterations, elapsed, self.iterations / elapsed if elapsed else 0.0))
+            f.write("Top allocation growth over the window:\n")
+            for stat in snapshot.compare_to(self.first_snapshot, "lineno")[:self.top]:
+                f.write("{}\n".format(stat))
+        print("Profile of {} written to {}.*".format(self.name, base))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless renderer for Evo Thermal and Evo 64px recordings.
+
+Uses the same colormap (colormap.txt), AGC and nearest-neighbour upscaling as
+Evo_Thermal_visualization_py3.py and Evo_64px_visualization_py3.py, and writes
+PNG sequences or a video file through cv2.VideoWriter. Chunks of frames are
+rendered in parallel in a process pool, each worker opening the recording once.
+
+Recordings are either archives written by Evo_archive_py3.py or .npy files of
+shape (N, 32, 32) in celsius / (N, 8, 8) in millimeters.
+
+Usage:
+    python3 Evo_render_py3.py recording.tba out_dir/
+    python3 Evo_render_py3.py recording.tba out.avi --fps 14 --workers 16
+"""
+import os
+import argparse
+import multiprocessing
+from collections import deque
+import numpy as np
+import cv2
+
+from Evo_archive_py3 import ArchiveReader, dk_to_celsius
+
+CANVAS_SIZE = 600
+AGC_FRAMES = 10  # Same min/max averaging window as the Tk visualization
+LABEL_COLOR = (0x00, 0xD5, 0xF2)  # "#f2d500" in BGR
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv")
+
+_recording = None  # (count, shape, read, archive) of a worker process, set by init_worker
+_colormap = None
+
+
+def load_colormap(path=None):
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "colormap.txt")
+    r = []
+    g = []
+    b = []
+    with open(path, 'r') as f:
+        for i in range(256):
+            x, y, z = f.readline().split(',')
+            r.append(x)
+            g.append(y)
+            b.append(z.replace(";\n", ""))
+    colormap = np.zeros((256, 1, 3), dtype=np.uint8)
+    colormap[:, 0, 0] = b
+    colormap[:, 0, 1] = g
+    colormap[:, 0, 2] = r
+    return colormap
+
+
+def open_recording(path, index=None):
+    '''
+    Returns (frame count, frame shape, reader function, archive). The reader
+    function takes (start, stop) and returns thermal frames in celsius or 64px
+    frames in millimeters. Workers call it themselves so frames are never
+    pickled. archive is the ArchiveReader to close, None for .npy files;
+    index is the block index of an archive already opened.
+    '''
+    if path.endswith(".npy"):
+        frames = np.load(path, mmap_mode='r')
+        read = lambda start, stop: np.asarray(frames[start:stop], dtype=np.float64)
+        return len(frames), frames.shape[1:], read, None
+    archive = ArchiveReader(path, index)
+    if archive.shape == (32, 32):
+        read = lambda start, stop: dk_to_celsius(archive.read_frames(start, stop))
+    else:
+        read = lambda start, stop: archive.read_frames(start, stop).astype(np.float64)
+    return len(archive), archive.shape, read, archive
+
+
+def init_worker(path, index):
+    ### The recording stays open for all the chunks of the worker, it is closed when the process exits ###
+    global _recording, _colormap
+    _recording = open_recording(path, index)
+    _colormap = load_colormap()
+
+
+def thermal_agc_bounds(count, read):
+    '''
+    Computes the AGC min/max of every frame up front, exactly like
+    EvoThermal.get_thermals() does live: the average over the last 10 frames,
+    or the frame's own min/max until 10 frames have been seen.
+    Chunks then render independently with continuous AGC at their boundaries.
+    '''
+    mins = np.empty(count)
+    maxs = np.empty(count)
+    step = 4096
+    for start in range(0, count, step):
+        frames = read(start, start + step)
+        mins[start:start + len(frames)] = frames.min(axis=(1, 2))
+        maxs[start:start + len(frames)] = frames.max(axis=(1, 2))
+
+    avg_min = mins.copy()
+    avg_max = maxs.copy()
+    if count >= AGC_FRAMES:
+        window = np.ones(AGC_FRAMES) / AGC_FRAMES
+        avg_min[AGC_FRAMES - 1:] = np.convolve(mins, window, mode='valid')
+        avg_max[AGC_FRAMES - 1:] = np.convolve(maxs, window, mode='valid')
+    return avg_min, avg_max
+
+
+def render_thermal(frames, avg_min, avg_max, colormap):
+    ### Scale whole chunk at once, same as get_thermals() + update_GUI() ###
+    lo = avg_min[:, None, None]
+    hi = avg_max[:, None, None]
+    span = np.where(hi > lo, hi - lo, 1.0)
+    data = (np.clip(frames, lo, hi) - lo) * (255 / span)
+    data = np.round(data, 0).astype(np.uint8)
+    images = []
+    for frame in data:
+        frame = cv2.applyColorMap(frame, colormap)
+        images.append(cv2.resize(frame, (CANVAS_SIZE, CANVAS_SIZE), interpolation=cv2.INTER_NEAREST))
+    return images
+
+
+def render_64px(frames):
+    ### Same depth / 64 greyscale mapping as Evo_64px.array_2_image() ###
+    rounded = np.round(frames, 0)
+    data = (rounded / 64.0).astype(np.uint8)
+    cell = CANVAS_SIZE / 8
+    images = []
+    for depth, frame in zip(rounded.astype(np.int64), data):
+        frame = cv2.resize(frame, (CANVAS_SIZE, CANVAS_SIZE), interpolation=cv2.INTER_NEAREST)
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        for i in range(8):
+            for j in range(8):
+                text = str(depth[i][j])
+                (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+                cv2.putText(frame, text, (int(j * cell + (cell - w) / 2), int(i * cell + (cell + h) / 2)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, LABEL_COLOR, 2)
+        images.append(frame)
+    return images
+
+
+def add_frame_number(image, index):
+    cv2.putText(image, "Frame {}".format(index), (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return image
+
+
+def render_chunk(args):
+    '''
+    Worker: renders frames [start, stop). Writes PNG files directly when
+    out_dir is given, otherwise returns the images for the video writer.
+    '''
+    start, stop, avg_min, avg_max, out_dir = args
+    count, shape, read, archive = _recording
+    frames = read(start, stop)
+    if shape == (32, 32):
+        images = render_thermal(frames, avg_min, avg_max, _colormap)
+    else:
+        images = render_64px(frames)
+    images = [add_frame_number(image, start + i) for i, image in enumerate(images)]
+
+    if out_dir is None:
+        return images
+    for i, image in enumerate(images):
+        cv2.imwrite(os.path.join(out_dir, "frame_{:06d}.png".format(start + i)), image)
+    return len(images)
+
+
+def render(path, output, workers=None, chunk_frames=64, fps=14.0):
+    count, shape, read, archive = open_recording(path)
+    if shape == (32, 32):
+        avg_min, avg_max = thermal_agc_bounds(count, read)
+    else:
+        avg_min = avg_max = np.zeros(count)
+    index = None
+    if archive is not None:
+        index = archive.index  # Workers reuse it instead of reading or rebuilding it again
+        archive.close()
+
+    to_video = output.lower().endswith(VIDEO_EXTENSIONS)
+    out_dir = None
+    if not to_video:
+        out_dir = output
+        os.makedirs(out_dir, exist_ok=True)
+
+    chunks = []
+    for start in range(0, count, chunk_frames):
+        stop = min(start + chunk_frames, count)
+        chunks.append((start, stop, avg_min[start:stop], avg_max[start:stop], out_dir))
+
+    workers = workers or os.cpu_count() or 1
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(path, index))
+    try:
+        if to_video:
+            ### Chunks are written in order by the single writer, with at most 2 per worker in ###
+            ### flight so rendered images do not pile up in memory when the encoder is slower ###
+            fourcc = cv2.VideoWriter_fourcc(*("mp4v" if output.lower().endswith(".mp4") else "MJPG"))
+            writer = cv2.VideoWriter(output, fourcc, fps, (CANVAS_SIZE, CANVAS_SIZE))
+            rendered = 0
+            in_flight = deque()
+            for i in range(len(chunks) + 1):
+                while in_flight and (len(in_flight) == 2 * workers or i == len(chunks)):
+                    images = in_flight.popleft().get()
+                    for image in images:
+                        writer.write(image)
+                    rendered += len(images)
+                if i < len(chunks):
+                    in_flight.append(pool.apply_async(render_chunk, (chunks[i],)))
+            writer.release()
+        else:
+            rendered = sum(pool.imap_unordered(render_chunk, chunks))
+    finally:
+        pool.close()
+        pool.join()
+    print("Rendered {} frames to {}".format(rendered, output))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render an Evo Thermal / Evo 64px recording headlessly")
+    parser.add_argument("recording", help=".tba archive or .npy recording")
+    parser.add_argument("output", help="Output directory for PNG files, or video file (.avi, .mp4, .mkv)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=64, help="Frames per worker task")
+    parser.add_argument("--fps", type=float, default=14.0, help="Video frame rate")
+    args = parser.parse_args()
+    render(args.recording, args.output, args.workers, args.chunk, args.fps)
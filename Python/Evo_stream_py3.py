@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frame streaming server and client for sharing one Evo sensor between several
+processes on the host or the LAN.
+
+The server owns the serial port through the existing drivers and publishes
+every frame over TCP and/or multicast UDP. Each frame is encoded once in a
+compact length-prefixed binary message:
+
+    length   : uint32, size of everything below
+    header   : magic "EVOF", sensor type, dtype, rows, cols,
+               sequence number, timestamp, scale, offset
+    payload  : rows * cols values, little endian
+
+Values are rebuilt on the client as payload * scale + offset, so Evo Thermal
+frames travel as 2 kB of uint16 dK and come out in celsius. Timestamps are
+the drivers' host monotonic arrival times (see Evo_transport_py3), so frames
+of several sensors served from the same host can be fed to
+Evo_alignment_py3.StreamAligner as they are.
+
+TCP clients send one subscription message after connecting (magic "EVOS",
+decimation) and only get every n-th frame. Client sockets are non-blocking;
+a client whose queue is full either loses its oldest frames or is dropped.
+
+Usage:
+    python3 Evo_stream_py3.py server thermal|64px|mini [--port 5740] [--multicast 239.0.0.57]
+    python3 Evo_stream_py3.py client <host> [--port 5740] [--every 1]
+    python3 Evo_stream_py3.py multicast <group> [--port 5740]
+"""
+import sys
+import time
+import socket
+import struct
+import selectors
+import threading
+import argparse
+from collections import deque
+import numpy as np
+
+DEFAULT_PORT = 5740
+LENGTH = struct.Struct("<I")
+FRAME_HEADER = struct.Struct("<4sBBHHIddd")
+SUBSCRIPTION = struct.Struct("<4sH")
+FRAME_MAGIC = b"EVOF"
+SUBSCRIPTION_MAGIC = b"EVOS"
+
+SENSOR_THERMAL = 1
+SENSOR_64PX = 2
+SENSOR_MINI = 3
+SENSOR_NAMES = {"thermal": SENSOR_THERMAL, "64px": SENSOR_64PX, "mini": SENSOR_MINI}
+
+DTYPES = {0: np.dtype("<u2"), 1: np.dtype("<f4")}
+DTYPE_CODES = {np.dtype("<u2"): 0, np.dtype("<f4"): 1}
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+
+def encode_frame(sensor, data, seq, timestamp, scale=1.0, offset=0.0):
+    data = np.atleast_2d(data)
+    header = FRAME_HEADER.pack(FRAME_MAGIC, sensor, DTYPE_CODES[data.dtype], data.shape[0], data.shape[1],
+                               seq & 0xFFFFFFFF, timestamp, scale, offset)
+    payload = data.tobytes()
+    return LENGTH.pack(len(header) + len(payload)) + header + payload
+
+
+def decode_frame(message):
+    '''
+    Decodes one message (without its length prefix).
+    Returns (sensor, seq, timestamp, array)
+    '''
+    magic, sensor, dtype, rows, cols, seq, timestamp, scale, offset = FRAME_HEADER.unpack_from(message)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Bad frame magic")
+    data = np.frombuffer(message, dtype=DTYPES[dtype], count=rows * cols, offset=FRAME_HEADER.size)
+    data = data.reshape(rows, cols)
+    if scale != 1.0 or offset != 0.0:
+        data = data * np.float64(scale) + np.float64(offset)
+    return sensor, seq, timestamp, data
+
+
+class ClientConnection(object):
+
+    def __init__(self, sock, address, max_queue):
+        self.sock = sock
+        self.address = address
+        self.every = None  # Set once the subscription is received
+        self.inbox = b""
+        self.queue = deque()
+        self.max_queue = max_queue
+        self.current = None  # memoryview of the message being written
+        self.dropped = 0
+
+
+class StreamServer(object):
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, multicast_group=None, multicast_ttl=1,
+                 max_queue=8, slow_client_policy=DROP_OLDEST):
+        self.max_queue = max_queue  # Frames queued per client before the slow client policy applies
+        self.slow_client_policy = slow_client_policy
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.seq = 0
+        self.running = True  # Cleared by stop(), set here so a stop() right after start() is not missed
+        self.thread = None
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+
+        ### Wakes the selector up when the reader thread publishes a frame ###
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ)
+
+        self.multicast = None
+        if multicast_group is not None:
+            self.multicast = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.multicast.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, multicast_ttl)
+            self.multicast.setblocking(False)
+            self.multicast_address = (multicast_group, port)
+
+    def publish(self, sensor, data, scale=1.0, offset=0.0, timestamp=None):
+        '''
+        Thread safe: encodes the frame once and hands it to the network loop.
+        timestamp is the driver's monotonic arrival time of the frame, the
+        publish time on the same clock when not given.
+        '''
+        if timestamp is None:
+            timestamp = time.monotonic()
+        message = encode_frame(sensor, data, self.seq, timestamp, scale, offset)
+        seq = self.seq
+        self.seq += 1
+
+        if self.multicast is not None:
+            try:
+                self.multicast.sendto(message[LENGTH.size:], self.multicast_address)
+            except (BlockingIOError, OSError):
+                pass  # Multicast is best effort, a lost datagram is a lost frame
+
+        with self.lock:
+            self.pending.append((seq, message))
+        try:
+            self.wakeup_send.send(b"\x00")
+        except BlockingIOError:
+            pass  # Selector already has a pending wake up
+
+    def serve_forever(self):
+        while self.running:
+            for key, events in self.selector.select(timeout=0.5):
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif key.fileobj is self.wakeup_recv:
+                    self.drain_wakeup()
+                else:
+                    client = key.data
+                    if events & selectors.EVENT_READ:
+                        self.read_client(client)
+                    if events & selectors.EVENT_WRITE and client.sock in self.clients:
+                        self.write_client(client)
+            self.dispatch()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        ### The network loop is woken up and joined first, it must not use the sockets being closed ###
+        self.running = False
+        try:
+            self.wakeup_send.send(b"\x00")
+        except BlockingIOError:
+            pass
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        for client in list(self.clients.values()):
+            self.drop_client(client)
+        self.selector.close()
+        self.listener.close()
+        self.wakeup_recv.close()
+        self.wakeup_send.close()
+        if self.multicast is not None:
+            self.multicast.close()
+
+    def accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = ClientConnection(sock, address, self.max_queue)
+        self.clients[sock] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        print("Client connected from {}".format(address))
+
+    def drain_wakeup(self):
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def read_client(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop_client(client)
+            return
+        client.inbox += data
+        while len(client.inbox) >= SUBSCRIPTION.size:
+            magic, every = SUBSCRIPTION.unpack_from(client.inbox)
+            client.inbox = client.inbox[SUBSCRIPTION.size:]
+            if magic != SUBSCRIPTION_MAGIC:
+                print("Bad subscription from {}. Dropping client".format(client.address))
+                self.drop_client(client)
+                return
+            client.every = max(1, every)
+
+    def dispatch(self):
+        with self.lock:
+            messages = list(self.pending)
+            self.pending.clear()
+        if not messages:
+            return
+        for client in list(self.clients.values()):
+            if client.every is None:
+                continue
+            for seq, message in messages:
+                if seq % client.every != 0:
+                    continue
+                if len(client.queue) >= client.max_queue:
+                    if self.slow_client_policy == DISCONNECT:
+                        print("Client {} too slow. Dropping client".format(client.address))
+                        self.drop_client(client)
+                        break
+                    client.queue.popleft()
+                    client.dropped += 1
+                client.queue.append(message)
+            if client.sock in self.clients:
+                self.write_client(client)
+
+    def write_client(self, client):
+        ### Non-blocking writes: send as much as the socket takes, resume on EVENT_WRITE ###
+        try:
+            while True:
+                if client.current is None:
+                    if not client.queue:
+                        break
+                    client.current = memoryview(client.queue.popleft())
+                sent = client.sock.send(client.current)
+                client.current = client.current[sent:]
+                if len(client.current) == 0:
+                    client.current = None
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.drop_client(client)
+            return
+
+        events = selectors.EVENT_READ
+        if client.current is not None or client.queue:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(client.sock, events, client)
+
+    def drop_client(self, client):
+        if client.sock not in self.clients:
+            return
+        del self.clients[client.sock]
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        print("Client {} disconnected ({} frames dropped)".format(client.address, client.dropped))
+
+
+class StreamClient(object):
+
+    def __init__(self, host, port=DEFAULT_PORT, every=1, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(SUBSCRIPTION.pack(SUBSCRIPTION_MAGIC, every))
+        self.buffer = bytearray()
+
+    def fill(self, size):
+        while len(self.buffer) < size:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("Stream server closed the connection")
+            self.buffer += data
+
+    def get_frame(self):
+        '''
+        Blocks until the next frame and returns (sensor, seq, timestamp, array)
+        '''
+        self.fill(LENGTH.size)
+        length = LENGTH.unpack_from(self.buffer)[0]
+        self.fill(LENGTH.size + length)
+        message = bytes(self.buffer[LENGTH.size:LENGTH.size + length])
+        del self.buffer[:LENGTH.size + length]
+        return decode_frame(message)
+
+    def __iter__(self):
+        while True:
+            yield self.get_frame()
+
+    def close(self):
+        self.sock.close()
+
+
+class MulticastClient(object):
+
+    def __init__(self, group, port=DEFAULT_PORT, interface="0.0.0.0", timeout=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("", port))
+        membership = socket.inet_aton(group) + socket.inet_aton(interface)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.sock.settimeout(timeout)
+
+    def get_frame(self):
+        return decode_frame(self.sock.recv(65536))
+
+    def __iter__(self):
+        while True:
+            yield self.get_frame()
+
+    def close(self):
+        self.sock.close()
+
+
+def serve_sensor(name, server):
+    '''
+    Reads frames from the sensor with the existing drivers and publishes them
+    until interrupted
+    '''
+    if name == "thermal":
+        from Evo_Thermal_sample_py3 import EvoThermal
+        from Evo_archive_py3 import celsius_to_dk
+        evo = EvoThermal()
+        try:
+            while True:
+                data = celsius_to_dk(evo.get_thermals())
+                server.publish(SENSOR_THERMAL, data, 0.1, -273.15, timestamp=evo.timestamp)
+        except KeyboardInterrupt:
+            evo.stop()
+    elif name == "64px":
+        from Evo_64px_sample_py3 import Evo_64px
+        evo_64px = Evo_64px()
+        evo_64px.reader.reset()
+        if evo_64px.profile.usb_vcp:  # Sending VCP start when connected via USB
+            evo_64px.start_sensor()
+        try:
+            while True:
+                depth_array = evo_64px.get_depth_array().astype(np.uint16)
+                server.publish(SENSOR_64PX, depth_array, timestamp=evo_64px.timestamp)
+        except KeyboardInterrupt:
+            if evo_64px.profile.usb_vcp:
+                evo_64px.stop_sensor()
+    elif name == "mini":
+        from Evo_Mini_py3 import Evo_Mini
+        sensor = Evo_Mini()
+        sensor.port.flushInput()
+        sensor.set_binary_mode()
+        try:
+            while True:
+                ranges = sensor.get_ranges()
+                if isinstance(ranges, list) and ranges:  # Skip "Waiting for frame header" messages
+                    server.publish(SENSOR_MINI, np.array(ranges, dtype=np.float32), timestamp=sensor.timestamp)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evo frame streaming server and client")
+    parser.add_argument("mode", choices=["server", "client", "multicast"])
+    parser.add_argument("target", help="Sensor (thermal, 64px, mini) for server, host or group for clients")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--multicast", default=None, help="Also publish to this multicast group")
+    parser.add_argument("--every", type=int, default=1, help="Client: only receive every n-th frame")
+    parser.add_argument("--policy", choices=[DROP_OLDEST, DISCONNECT], default=DROP_OLDEST)
+    args = parser.parse_args()
+
+    if args.mode == "server":
+        if args.target not in SENSOR_NAMES:
+            print("Unknown sensor {}".format(args.target))
+            sys.exit(1)
+        server = StreamServer(port=args.port, multicast_group=args.multicast, slow_client_policy=args.policy)
+        server.start()
+        serve_sensor(args.target, server)
+        server.stop()
+    else:
+        if args.mode == "client":
+            client = StreamClient(args.target, args.port, args.every)
+        else:
+            client = MulticastClient(args.target, args.port)
+        try:
+            for sensor, seq, timestamp, data in client:
+                print(seq, timestamp)
+                print(data)
+        except KeyboardInterrupt:
+            client.close()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk parser for the ASCII output of TeraRanger Evo (TEXT_MODE) and MultiFlex
+(Multiflex_set_text_mode.py) sensors.
+
+Lines look like "T\t1234\r\n" for Evo sensors (one field per pixel for
+Evo Mini) and "MF\t1234\t...\r\n" for MultiFlex (8 ranges, optionally
+followed by the sensor active bitmask). Ranges are in millimeters, with
+"+Inf" / "-Inf" / "-1" for above maximum range, below minimum range and
+unable to measure.
+
+Whole buffered chunks are split on line boundaries and all fields are converted
+with a single numpy call; incomplete lines are kept for the next read. Output
+matches the binary readers: (N, channels) arrays in meters with inf, -inf
+and nan for the special cases.
+
+Usage:
+    python3 Evo_text_mode_py3.py evo|mini|multiflex <port>
+"""
+import sys
+import warnings
+import numpy as np
+import serial
+import threading
+from Evo_frames_py3 import check_ranges
+
+### Bytes a numeric field can hold, any other byte makes its line malformed ###
+NUMERIC = np.zeros(256, dtype=bool)
+NUMERIC[np.frombuffer(b"0123456789+-.Infi \t\r\n", dtype=np.uint8)] = True
+
+
+class TextModeParser(object):
+
+    def __init__(self, header=b"T", channels=None, mask_field=False, max_line=128):
+        self.header = header
+        self.channels = channels  # Ranges per line, None to use the most common count of each chunk
+        self.mask_field = mask_field  # Lines may end with an extra sensor active bitmask field
+        self.max_line = max_line  # Partial data kept without a newline is bounded to this
+        self.buffer = bytearray()
+
+    def empty(self, channels):
+        return np.empty((0, channels or 0)), np.empty(0, dtype=np.uint8)
+
+    def parse(self, data):
+        '''
+        Adds data to the buffer and parses every complete line.
+        Returns (ranges, masks): a (N, channels) array in meters and a (N,)
+        array of bitmasks (all channels active when lines carry no mask).
+        Channels flagged inactive in the bitmask are reported as nan.
+        '''
+        self.buffer += data
+        end = self.buffer.rfind(b"\n")
+        if end == -1:
+            if len(self.buffer) > self.max_line:
+                del self.buffer[:-self.max_line]
+            return self.empty(self.channels)
+        complete = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+
+        ### Tokens per line and line headers, computed on the bytes of the whole chunk ###
+        buf = np.frombuffer(complete, dtype=np.uint8)
+        newline = buf == 0x0A
+        whitespace = newline | (buf == 0x09) | (buf == 0x20) | (buf == 0x0D)
+        token_start = ~whitespace
+        token_start[1:] &= whitespace[:-1]
+        line_starts = np.concatenate(([0], np.flatnonzero(newline) + 1))
+        line_starts = line_starts[line_starts < len(buf)]
+        tokens = np.add.reduceat(token_start, line_starts, dtype=np.int32)
+        size = len(self.header)
+        has_header = line_starts + size < len(buf)
+        for k in range(size):
+            index = np.minimum(line_starts + k, len(buf) - 1)
+            has_header &= buf[index] == self.header[k]
+        has_header &= whitespace[np.minimum(line_starts + size, len(buf) - 1)]
+        counts = tokens - 1  # The header is a token too
+
+        ### Lines with non-numeric bytes outside the header are rejected before conversion ###
+        invalid = ~NUMERIC[buf]
+        for k in range(size):
+            invalid[np.minimum(line_starts[has_header] + k, len(buf) - 1)] = False
+        numeric = np.add.reduceat(invalid, line_starts, dtype=np.int32) == 0
+        if not np.any(has_header):
+            return self.empty(self.channels)
+
+        if self.channels is None:
+            fields = int(np.bincount(counts[has_header]).argmax())
+        elif self.mask_field and np.any(has_header & (counts == self.channels + 1)):
+            fields = self.channels + 1
+        else:
+            fields = self.channels
+        keep = has_header & (counts == fields) & numeric
+        if fields == 0 or not np.any(keep):
+            return self.empty(self.channels)
+        malformed = np.count_nonzero(has_header) - np.count_nonzero(keep)
+        if malformed:
+            print("Discarding {} malformed lines".format(malformed))
+
+        ### Blank out headers and rejected lines, then convert everything at once ###
+        text = buf.copy()
+        if not np.all(keep):
+            line_lengths = np.diff(np.append(line_starts, len(buf)))
+            text[~np.repeat(keep, line_lengths) & ~newline] = 0x20
+        for k in range(size):
+            text[line_starts[keep] + k] = 0x20
+        values = self.convert(text.tobytes(), np.count_nonzero(keep), fields)
+
+        if self.mask_field and fields == self.channels + 1:
+            masks = values[:, -1].astype(np.uint8)
+            ranges = self.check_ranges(values[:, :-1])
+            ### Inactive channels are nan, as in Multiflex.check_ranges ###
+            active = ((masks[:, None] >> np.arange(self.channels)) & 1).astype(bool)
+            ranges[~active] = float('nan')
+            return ranges, masks
+        return self.check_ranges(values), np.full(len(values), 0xFF, dtype=np.uint8)
+
+    def convert(self, text, rows, fields):
+        ### Special values become their binary sentinels, so the chunk parses as integers ###
+        if b"nf" in text:
+            for token, value in ((b"+Inf", b"65535"), (b"-Inf", b"0"), (b"Inf", b"65535"),
+                                 (b"+inf", b"65535"), (b"-inf", b"0"), (b"inf", b"65535")):
+                text = text.replace(token, value)
+
+        ### One conversion call for the whole chunk, per line only if a malformed number got through ###
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            for dtype in (np.int64, np.float64):
+                try:
+                    values = np.fromstring(text, dtype=dtype, sep=" ")
+                    if values.size == rows * fields:
+                        return values.reshape(rows, fields)
+                except (ValueError, DeprecationWarning):
+                    pass
+            values = []
+            for line in text.split(b"\n"):
+                try:
+                    row = np.fromstring(line, sep=" ")
+                except (ValueError, DeprecationWarning):
+                    continue
+                if row.size == fields:
+                    values.append(row)
+        if not values:
+            return np.empty((0, fields))
+        return np.stack(values)
+
+    def check_ranges(self, raw):
+        '''
+        Same meaning as Evo_Mini.check_ranges, for text values. The binary
+        sentinels are mapped too, for sensors that print them as numbers.
+        '''
+        ranges = check_ranges(raw)
+        ranges[raw == -1] = float('nan')  # Sensor not able to measure, as printed in text mode
+        return ranges
+
+
+class TextModeReader(object):
+    '''
+    Reads text mode data from an open serial port in blocks sized to
+    in_waiting and exposes the same single-frame, batch and iterator API
+    as Multiflex_py3.Multiflex
+    '''
+
+    def __init__(self, port, parser):
+        self.port = port
+        self.parser = parser
+        self.serial_lock = threading.Lock()
+        self.pending = None
+
+    def read_available(self):
+        with self.serial_lock:
+            data = self.port.read(max(1, self.port.in_waiting))
+        return self.parser.parse(data)
+
+    def get_ranges_batch(self, count):
+        ranges = []
+        masks = []
+        received = 0
+        if self.pending is not None:
+            ranges.append(self.pending[0])
+            masks.append(self.pending[1])
+            received = len(self.pending[0])
+        while received < count:
+            new_ranges, new_masks = self.read_available()
+            if len(new_ranges):
+                ranges.append(new_ranges)
+                masks.append(new_masks)
+                received += len(new_ranges)
+        ranges = np.concatenate(ranges)
+        masks = np.concatenate(masks)
+        self.pending = (ranges[count:], masks[count:])
+        return ranges[:count], masks[:count]
+
+    def get_ranges(self):
+        '''
+        Returns the next line as (list of ranges in meters, bitmask), like Multiflex.get_ranges
+        '''
+        ranges, masks = self.get_ranges_batch(1)
+        return ranges[0].tolist(), int(masks[0])
+
+    def __iter__(self):
+        while True:
+            if self.pending is not None:
+                ranges, masks = self.pending
+                self.pending = None
+            else:
+                ranges, masks = self.read_available()
+            for i in range(len(ranges)):
+                yield ranges[i], int(masks[i])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print('\n[ERROR] Correct usage $ python3 Evo_text_mode_py3.py evo|mini|multiflex port')
+        sys.exit(1)
+
+    sensor, port_name = sys.argv[1], sys.argv[2]
+    if sensor == "multiflex":
+        from Multiflex_py3 import Multiflex
+        device = Multiflex(port_name)
+        device.set_text_mode()
+        parser = TextModeParser(b"MF", channels=8, mask_field=True)
+    elif sensor == "mini":
+        from Evo_Mini_py3 import Evo_Mini
+        device = Evo_Mini(port_name)
+        device.set_text_mode()
+        parser = TextModeParser(b"T")
+    else:
+        device = None
+        parser = TextModeParser(b"T", channels=1)
+
+    if device is not None:
+        port = device.port
+    else:
+        port = serial.Serial(port_name, baudrate=115200, timeout=1)
+        port.write(b"\x00\x11\x01\x45")  # Evo TEXT_MODE command
+    reader = TextModeReader(port, parser)
+    try:
+        for ranges, mask in reader:
+            print(ranges)
+    except KeyboardInterrupt:
+        port.close()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serial transport helpers shared by the Evo Thermal and Evo 64px drivers.
+
+A transport profile tells a driver which baudrate to use and whether the
+sensor is behind the USB VCP (which needs the start/stop output commands) or
+a UART backboard (460800 for Evo Thermal, 3000000 for Evo 64px).
+
+FrameReader replaces fixed-size blocking reads: it reads everything waiting on
+the port in one block, with a timeout sized to the frame time at the current
+baudrate, and extracts all complete frames that pass the driver's check.
+Each frame is stamped with the host monotonic time at which its first byte
+arrived. On a UART link bytes cannot arrive faster than the baudrate, so the
+read time minus the wire time of everything received from the frame's first
+byte on is the latest time that byte can have arrived; frames read together
+get distinct, ordered stamps. Over the USB VCP the baudrate is nominal and
+data comes in bursts of a few ms, so the read time is used as is.
+"""
+import time
+import serial
+import serial.tools.list_ports
+from collections import deque
+
+
+class TransportProfile(object):
+    def __init__(self, name, baudrate, usb_vcp):
+        self.name = name
+        self.baudrate = baudrate
+        self.usb_vcp = usb_vcp  # Output must be started/stopped with commands
+
+    def __repr__(self):
+        return "{} ({} baud)".format(self.name, self.baudrate)
+
+
+USB_VCP = TransportProfile("USB VCP", 115200, True)
+THERMAL_BACKBOARD = TransportProfile("UART backboard", 460800, False)
+EVO_64PX_BACKBOARD = TransportProfile("UART backboard", 3000000, False)
+
+
+def frame_timeout(frame_length, baudrate, frames=2.0):
+    ### Time to receive a few frames at this baudrate (10 bits per byte), never below 10 ms ###
+    return max(0.01, frames * frame_length * 10.0 / baudrate)
+
+
+def arrival_time(read_time, received, baudrate=None):
+    '''
+    Host time at which a frame started arriving, given the time of the read
+    and the number of bytes received from its first byte up to that read
+    (scalar or numpy array). baudrate is None for USB VCP links.
+    '''
+    if baudrate is None:
+        return read_time
+    return read_time - received * 10.0 / baudrate
+
+
+def open_port(portname, profile, frame_length):
+    return serial.Serial(
+        port=portname,
+        baudrate=profile.baudrate,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS,
+        timeout=frame_timeout(frame_length, profile.baudrate)
+    )
+
+
+class FrameReader(object):
+
+    def __init__(self, port, header, frame_length, check, usb_vcp=False):
+        self.port = port
+        self.header = header
+        self.frame_length = frame_length
+        self.check = check  # Returns True for a complete frame with a valid CRC
+        self.wire_baudrate = None if usb_vcp else port.baudrate  # Used for transfer time compensation
+        self.buffer = bytearray()
+        self.frames = deque()  # (arrival time, frame) pairs
+        self.timestamp = None  # Arrival time of the last frame returned
+
+    def read_frames(self):
+        '''
+        Reads everything waiting on the port (at least the rest of one frame)
+        and queues every complete valid frame found in the buffer
+        '''
+        needed = max(1, self.frame_length - len(self.buffer))
+        self.buffer += self.port.read(max(self.port.in_waiting, needed))
+        read_time = time.monotonic()
+        received = len(self.buffer)
+
+        pos = 0
+        while True:
+            start = self.buffer.find(self.header, pos)
+            if start == -1:
+                pos = max(pos, len(self.buffer) - len(self.header) + 1)
+                break
+            if start + self.frame_length > len(self.buffer):
+                pos = start  # Incomplete frame, finish it on the next read
+                break
+            frame = bytes(self.buffer[start:start + self.frame_length])
+            if self.check(frame):
+                self.frames.append((arrival_time(read_time, received - start, self.wire_baudrate), frame))
+                pos = start + self.frame_length
+            else:
+                pos = start + 1  # Header bytes inside data, keep searching
+        del self.buffer[:pos]
+        return len(self.frames)
+
+    def get_frame(self):
+        ''' Returns the next frame, in reception order '''
+        while not self.frames:
+            self.read_frames()
+        self.timestamp, frame = self.frames.popleft()
+        return frame
+
+    def get_latest_frame(self):
+        ''' Returns the most recent frame and drops older ones, like flushInput() did '''
+        self.read_frames()
+        while not self.frames:
+            self.read_frames()
+        self.timestamp, frame = self.frames.pop()
+        self.frames.clear()
+        return frame
+
+    def reset(self):
+        self.port.reset_input_buffer()
+        self.buffer = bytearray()
+        self.frames.clear()
+
+
+def is_usb_vcp(portname):
+    ''' True if the port is the sensor's own USB VCP (Terabee USB id, ":5740" in the hardware id) '''
+    for p in serial.tools.list_ports.comports():
+        if p[0] == portname and ":5740" in p[2]:
+            return True
+    return False
+
+
+def detect_profile(portname, profiles, header, frame_length, check, probe_time=0.5):
+    '''
+    Returns USB_VCP if the port is the sensor's USB VCP, which accepts any
+    baudrate and would pass every probe while already streaming. Otherwise
+    opens the port with each profile in turn and returns the first one that
+    yields a frame with a valid CRC, or None
+    '''
+    if is_usb_vcp(portname):
+        return USB_VCP
+    for profile in profiles:
+        port = open_port(portname, profile, frame_length)
+        reader = FrameReader(port, header, frame_length, check)
+        reader.reset()
+        deadline = time.monotonic() + probe_time + frame_timeout(frame_length, profile.baudrate)
+        found = False
+        while time.monotonic() < deadline and not found:
+            found = reader.read_frames() > 0
+        port.close()
+        if found:
+            print("Valid frames received at {} baud".format(profile.baudrate))
+            return profile
+    return None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TeraRanger MultiFlex driver for python 3.
+
+Streams binary frames and decodes whole buffers at once with numpy:
+
+    'M' 'F' | 8 x uint16 big endian ranges (mm) | sensor active bitmask | crc8
+
+Usage:
+    python3 Multiflex_py3.py <port>
+"""
+import sys
+import time
+import numpy as np
+import serial
+import threading
+from Evo_transport_py3 import arrival_time, is_usb_vcp
+from Evo_frames_py3 import crc8_table, scan_frames, check_ranges
+
+
+class Multiflex(object):
+    TEXT_MODE = b"\x00\x11\x01\x45"
+    BINARY_MODE = b"\x00\x11\x02\x4C"
+    ACK = b"\x52\x45\x11\x00\xD4"
+    NACK = b"\x52\x45\x11\xFF\x27"
+    FRAME_HEADER = b"MF"
+    FRAME_LENGTH = 20
+    CHANNELS = 8
+
+    def __init__(self, portname, baudrate=115200):
+        self.portname = portname
+        self.baudrate = baudrate
+        self.port = serial.Serial(
+            port=self.portname,
+            baudrate=self.baudrate,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            bytesize=serial.EIGHTBITS,
+            timeout=1,
+            writeTimeout=5
+        )
+        self.port.isOpen()
+        self.serial_lock = threading.Lock()
+        self.buffer = b""
+        self.pending = None  # Frames decoded but not returned yet
+        self.timestamps = np.empty(0)  # Host monotonic arrival times of the frames last returned
+        self.timestamp = None
+        self.wire_baudrate = None if is_usb_vcp(portname) else baudrate  # Transfer time compensation
+
+        self.crc_table = crc8_table()
+
+    def send_command(self, command, timeout=1.0):
+        '''
+        Writes a command and searches the incoming bytes for the ACK/NACK
+        pattern, like Multiflex_set_binary_mode.py. Frames received meanwhile
+        are kept in the buffer.
+        '''
+        with self.serial_lock:
+            self.port.write(command)
+            response = b""
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                response += self.port.read(max(1, self.port.in_waiting))
+                if response.find(Multiflex.ACK) != -1:
+                    self.buffer += response.replace(Multiflex.ACK, b"", 1)
+                    return True
+                if response.find(Multiflex.NACK) != -1:
+                    self.buffer += response.replace(Multiflex.NACK, b"", 1)
+                    print("Command not acknowledged")
+                    return False
+            self.buffer += response
+            print("No ACK received")
+            return False
+
+    def set_binary_mode(self):
+        if self.send_command(Multiflex.BINARY_MODE):
+            print("Sensor succesfully switched to binary mode")
+            return True
+        return False
+
+    def set_text_mode(self):
+        if self.send_command(Multiflex.TEXT_MODE):
+            print("Sensor succesfully switched to text mode")
+            return True
+        return False
+
+    def decode(self, data):
+        '''
+        Decodes every valid frame found in data. Returns (ranges, masks, rest)
+        where ranges is a (N, 8) array in meters, masks a (N,) uint8 array of
+        active sensors and rest the trailing bytes of an incomplete frame.
+        '''
+        _, ranges, masks, consumed = self.decode_frames(data)
+        return ranges, masks, data[consumed:]
+
+    def decode_frames(self, data):
+        ''' Same as decode, returning (starts, ranges, masks, consumed) with the frame offsets in data '''
+        starts, frames, consumed = scan_frames(data, Multiflex.FRAME_HEADER, Multiflex.FRAME_LENGTH, self.crc_table)
+        raw = (frames[:, 2:18:2].astype(np.uint16) << 8) | frames[:, 3:18:2]
+        masks = frames[:, 18]
+        return starts, self.check_ranges(raw, masks), masks, consumed
+
+    def check_ranges(self, raw, masks):
+        '''
+        Same sentinel mapping as Evo_Mini.check_ranges, for whole arrays.
+        Channels flagged inactive in the bitmask are reported as nan.
+        '''
+        ranges = check_ranges(raw)
+        active = ((masks[:, None] >> np.arange(Multiflex.CHANNELS)) & 1).astype(bool)
+        ranges[~active] = float('nan')
+        return ranges
+
+    def read_available(self, size=None):
+        '''
+        Reads and decodes what is waiting on the port. Returns (ranges, masks,
+        timestamps), timestamps being the host time the frames started arriving
+        (one stamp for all frames of a read, see Evo_transport_py3).
+        '''
+        with self.serial_lock:
+            data = self.port.read(size or max(1, self.port.in_waiting))
+            read_time = time.monotonic()
+        self.buffer += data
+        starts, ranges, masks, consumed = self.decode_frames(self.buffer)
+        timestamps = arrival_time(read_time, len(self.buffer) - starts, self.wire_baudrate)
+        self.buffer = self.buffer[consumed:]
+        return ranges, masks, np.full(len(ranges), timestamps, dtype=np.float64)
+
+    def get_ranges_batch(self, count):
+        '''
+        Returns the next count frames as ((count, 8) ranges, (count,) masks).
+        Their arrival times are left in self.timestamps.
+        '''
+        ranges = []
+        masks = []
+        timestamps = []
+        received = 0
+        if self.pending is not None:
+            ranges.append(self.pending[0])
+            masks.append(self.pending[1])
+            timestamps.append(self.pending[2])
+            received = len(self.pending[0])
+        while received < count:
+            needed = (count - received) * Multiflex.FRAME_LENGTH - len(self.buffer)
+            new_ranges, new_masks, new_timestamps = self.read_available(max(needed, self.port.in_waiting, 1))
+            ranges.append(new_ranges)
+            masks.append(new_masks)
+            timestamps.append(new_timestamps)
+            received += len(new_ranges)
+        ranges = np.concatenate(ranges)
+        masks = np.concatenate(masks)
+        timestamps = np.concatenate(timestamps)
+        ### Frames read past count are not lost, they are returned by the next call ###
+        self.pending = (ranges[count:], masks[count:], timestamps[count:])
+        self.timestamps = timestamps[:count]
+        return ranges[:count], masks[:count]
+
+    def get_ranges(self):
+        '''
+        Returns the next frame as (list of 8 ranges in meters, bitmask)
+        '''
+        ranges, masks = self.get_ranges_batch(1)
+        self.timestamp = float(self.timestamps[0])
+        return ranges[0].tolist(), int(masks[0])
+
+    def __iter__(self):
+        '''
+        Yields (ranges, mask) for every frame, decoding whatever is buffered
+        on the port at once. self.timestamp holds the arrival time of the
+        frame being yielded.
+        '''
+        while True:
+            if self.pending is not None:
+                ranges, masks, timestamps = self.pending
+                self.pending = None
+            else:
+                ranges, masks, timestamps = self.read_available()
+            for i in range(len(ranges)):
+                self.timestamp = float(timestamps[i])
+                yield ranges[i], int(masks[i])
+
+    def run(self):
+        self.port.flushInput()
+        self.set_binary_mode()  # Set binary output as it is required for this sample
+        for ranges, mask in self:
+            print("{:08b} {}".format(mask, ranges))
+
+    def stop(self):
+        self.port.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('\n[ERROR] Correct usage $ python3 Multiflex_py3.py port')
+        sys.exit(1)
+
+    multiflex = Multiflex(sys.argv[1])
+    try:
+        multiflex.run()
+    except KeyboardInterrupt:
+        multiflex.stop()